@@ -0,0 +1,211 @@
+"""
+Write-behind tracking of logins and user activity.
+
+Requests only put events into an in-memory buffer of the worker: the latest
+login and last-seen time per user (repeated updates of one user coalesce)
+and the login events themselves. A background thread writes the buffer
+every ``ACTIVITY_FLUSH_INTERVAL`` seconds as one UPDATE of ``CustomUser``
+plus one bulk INSERT into ``LoginEvent``; whatever is left is flushed when
+the worker exits (gunicorn ``worker_exit`` or ``atexit``).
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from core.metrics import registry
+
+from .models import LoginEvent
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+ACTIVITY_FLUSH_INTERVAL = getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 10.0)
+ACTIVITY_BUFFER_SIZE = getattr(settings, 'ACTIVITY_BUFFER_SIZE', 10000)
+
+# Пользователей на один UPDATE: по одному WHEN на каждого в CASE
+UPDATE_BATCH_SIZE = 500
+
+
+def _batches(pks):
+    pks = list(pks)
+    return [pks[i:i + UPDATE_BATCH_SIZE] for i in range(0, len(pks), UPDATE_BATCH_SIZE)]
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or None
+
+
+class ActivityTracker:
+    def __init__(self, interval=ACTIVITY_FLUSH_INTERVAL, buffer_size=ACTIVITY_BUFFER_SIZE):
+        self.interval = interval
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        # Сериализует запись: поток и worker_exit/atexit не пишут одновременно
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._atexit = False
+        self._logins = {}
+        self._seen = {}
+        self._events = []
+
+    def login(self, user, request=None):
+        now = timezone.now()
+        event = LoginEvent(user_id=user.pk, created_at=now)
+        if request is not None:
+            event.ip_address = client_ip(request)
+            event.user_agent = request.META.get('HTTP_USER_AGENT', '')[:255]
+        with self._lock:
+            if self._has_room(user.pk):
+                self._logins[user.pk] = now
+                self._seen[user.pk] = now
+            if len(self._events) >= self.buffer_size:
+                # БД недоступна дольше, чем помещается в буфер
+                registry.inc('activity_events_dropped_total', ())
+                return
+            self._events.append(event)
+            full = len(self._events) * 2 >= self.buffer_size
+        if full:
+            self._wake.set()
+
+    def seen(self, user_id):
+        now = timezone.now()
+        with self._lock:
+            if not self._has_room(user_id):
+                return
+            self._seen[user_id] = now
+            full = len(self._seen) * 2 >= self.buffer_size
+        if full:
+            self._wake.set()
+
+    def _has_room(self, user_id):
+        # Не больше buffer_size пользователей: остальных обновит следующий их запрос
+        if user_id in self._seen or len(self._seen) < self.buffer_size:
+            return True
+        registry.inc('activity_updates_dropped_total', ())
+        return False
+
+    def pending(self):
+        with self._lock:
+            return {'logins': len(self._logins), 'seen': len(self._seen), 'events': len(self._events)}
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                logins, self._logins = self._logins, {}
+                seen, self._seen = self._seen, {}
+                events, self._events = self._events, []
+            if not seen and not events:
+                return 0
+            try:
+                written = self._write(logins, seen, events)
+            except DatabaseError:
+                logger.warning('Cannot write %d login events, will retry', len(events), exc_info=True)
+                self._requeue(logins, seen, events)
+                return 0
+            registry.inc('activity_events_flushed_total', (), written)
+            return written
+
+    def _write(self, logins, seen, events):
+        # События могут остаться и у пользователей, не поместившихся в буфер seen
+        existing = set()
+        for pks in _batches({*seen, *(event.user_id for event in events)}):
+            # С primary: только что зарегистрированных пользователей на реплике может ещё не быть
+            existing.update(User.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=pks).values_list('pk', flat=True))
+        with transaction.atomic():
+            # Один UPDATE на пачку; GREATEST, чтобы более старое время из
+            # другого воркера не перезаписало новое. queryset.update() не
+            # трогает version (ETag профиля) и не шлёт post_save.
+            for pks in _batches(seen):
+                pks = [pk for pk in pks if pk in existing]
+                if not pks:
+                    continue
+                changes = {'last_seen': self._latest('last_seen', {pk: seen[pk] for pk in pks})}
+                batch_logins = {pk: logins[pk] for pk in pks if pk in logins}
+                if batch_logins:
+                    changes['last_login'] = self._latest('last_login', batch_logins)
+                User.objects.filter(pk__in=pks).update(**changes)
+            # Пользователь мог быть удалён, пока событие ждало в буфере
+            events = [event for event in events if event.user_id in existing]
+            LoginEvent.objects.bulk_create(events, batch_size=1000)
+        return len(events)
+
+    def _latest(self, field, times):
+        value = Case(*[When(pk=pk, then=Value(at)) for pk, at in times.items()], default=F(field))
+        return Greatest(Coalesce(F(field), value), value)
+
+    def _requeue(self, logins, seen, events):
+        with self._lock:
+            for pk in seen:
+                if not self._has_room(pk):
+                    continue
+                for target, times in ((self._seen, seen), (self._logins, logins)):
+                    if pk in times and (pk not in target or target[pk] < times[pk]):
+                        target[pk] = times[pk]
+            keep = max(self.buffer_size - len(self._events), 0)
+            if len(events) > keep:
+                registry.inc('activity_events_dropped_total', (), len(events) - keep)
+            self._events[:0] = events[-keep:] if keep else []
+
+    def start(self):
+        if not self.interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+                self._thread.start()
+                if not self._atexit:
+                    # Только у запущенного трекера: команды и тесты не пишут буфер при выходе
+                    atexit.register(self.stop)
+                    self._atexit = True
+
+    def stop(self):
+        """Stops the flush thread and writes what is left in the buffer."""
+        thread = self._thread
+        if thread is not None:
+            self._stopping = True
+            self._wake.set()
+            thread.join(timeout=self.interval + 5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            # Как в цикле запроса: закрыть соединение после CONN_MAX_AGE или ошибки
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Activity flush failed')
+
+    def reset_after_fork(self):
+        # Поток и буфер остались у родителя (мастер gunicorn с preload_app)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._logins, self._seen, self._events = {}, {}, []
+
+
+tracker = ActivityTracker()
+os.register_at_fork(after_in_child=tracker.reset_after_fork)
+
+
+@registry.collector
+def activity_metrics():
+    for name, count in tracker.pending().items():
+        yield 'activity_pending', (('kind', name),), count
@@ -1,11 +1,20 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, LoginEvent
+from .pagination import EstimatedCountPaginator
+from .revocation import revoke_tokens, start_revocation
+
+# Выше этого числа пользователей токены отзываются в фоне
+REVOKE_IN_BACKGROUND_AFTER = 100
+
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_staff')
     list_filter = ('is_staff', 'is_active')
+    # icontains даёт UPPER(col::text) LIKE ..., под это есть trigram-индексы (миграция 0003)
     search_fields = ('email', 'first_name', 'last_name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = ('email',)
     filter_horizontal = ('groups', 'user_permissions')  # Добавляем горизонтальные фильтры
 
@@ -15,9 +24,11 @@ class CustomUserAdmin(UserAdmin):
         ('Права', {
             'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions'),
         }),
+        ('Активность', {'fields': ('date_joined', 'last_login', 'last_seen')}),
     )
 
-    readonly_fields = ('date_joined',)
+    readonly_fields = ('date_joined', 'last_login', 'last_seen')
+    actions = ['revoke_all_tokens']
 
     add_fieldsets = (
         (None, {
@@ -28,4 +39,33 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+    @admin.action(description='Logout selected users from all devices')
+    def revoke_all_tokens(self, request, queryset):
+        if queryset.count() > REVOKE_IN_BACKGROUND_AFTER:
+            start_revocation(list(queryset.values_list('pk', flat=True)))
+            self.message_user(request, 'Token revocation started in background, progress is logged.')
+        else:
+            revoked = revoke_tokens(queryset.values('pk'))
+            self.message_user(request, f'Revoked {revoked} tokens.')
+
+
+admin.site.register(CustomUser, CustomUserAdmin)
+
+
+class LoginEventAdmin(admin.ModelAdmin):
+    # Журнал только для чтения, пишет его accounts.activity
+    list_display = ('user', 'created_at', 'ip_address', 'user_agent')
+    list_select_related = ('user',)
+    search_fields = ('user__email', 'ip_address')
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(LoginEvent, LoginEventAdmin)
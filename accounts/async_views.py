@@ -0,0 +1,145 @@
+"""
+Async variants of the auth and health views for the ASGI server.
+
+DRF 3.15 views are sync only, so these are plain Django async views with
+the same request/response format: serializers validate the input, the
+ORM is used through its async API and password hashing is awaited on the
+process pool (accounts.hashing), so the event loop never blocks on it.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, ParseError, Throttled
+
+from .activity import tracker
+from .authentication import CachedJWTAuthentication
+from .hashing import fail_fast
+from .health import readiness_probe
+from .revocation import revoke_tokens
+from .serializers import LoginSerializer, LogoutSerializer, RegisterSerializer
+from .throttling import check_request, login_throttle
+from .tokens import RefreshToken
+
+
+class AsyncAPIView(View):
+    """JSON in/out, JWT authentication and DRF-shaped error responses."""
+    authentication = CachedJWTAuthentication()
+    login_required = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Как и APIView: аутентификация по JWT, CSRF не нужен
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            # Занятый пул хеширования - 503 с Retry-After, как у sync-view
+            with fail_fast():
+                if self.login_required:
+                    await self.authenticate(request)
+                return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        result = await self.authentication.aauthenticate(request)
+        if result is None:
+            raise NotAuthenticated()
+        request.user, request.auth = result
+
+    def parse(self, request):
+        if request.content_type != 'application/json':
+            return request.POST
+        if not request.body:
+            return {}
+        try:
+            return json.loads(request.body)
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+    def handle_exception(self, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = JsonResponse(data, status=exc.status_code, safe=False)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(None)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = str(int(exc.wait))
+        return response
+
+
+class RegisterView(AsyncAPIView):
+    async def post(self, request):
+        serializer = RegisterSerializer(data=self.parse(request))
+        serializer.is_valid(raise_exception=True)
+        user = await serializer.acreate()
+        refresh = serializer.refresh
+
+        return JsonResponse({
+            'user': {
+                'email': user.email,
+                'first_name': user.first_name,
+                'last_name': user.last_name
+            },
+            'access': str(refresh.access_token),
+            'refresh': str(refresh)
+        }, status=status.HTTP_201_CREATED)
+
+
+class LoginView(AsyncAPIView):
+    async def post(self, request):
+        data = self.parse(request)
+        # До поиска пользователя и хеширования, как LoginRateThrottle у sync-view
+        wait = check_request(request, data.get('email') if hasattr(data, 'get') else None)
+        if wait is not None:
+            raise Throttled(wait)
+        user = (await LoginSerializer().avalidate(data))['user']
+        refresh = await RefreshToken.afor_user(user)
+        tracker.login(user, request)
+        login_throttle.succeeded(user.email)
+
+        return JsonResponse({
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+            'user': {
+                'email': user.email,
+                'full_name': f"{user.first_name} {user.last_name}",
+                'phone': user.phone,
+                'address': user.address,
+            }
+        }, status=status.HTTP_200_OK)
+
+
+class LogoutView(AsyncAPIView):
+    login_required = True
+
+    async def post(self, request):
+        serializer = LogoutSerializer(data=self.parse(request))
+        serializer.is_valid(raise_exception=True)
+        await serializer.asave()
+        return JsonResponse({'message': 'Successfully logged out'}, status=status.HTTP_205_RESET_CONTENT)
+
+
+class LogoutAllView(AsyncAPIView):
+    login_required = True
+
+    async def post(self, request):
+        await sync_to_async(revoke_tokens)([request.user.pk])
+
+        return JsonResponse({'message': 'Successfully logged out from all devices'},
+                            status=status.HTTP_205_RESET_CONTENT)
+
+
+class LivenessView(AsyncAPIView):
+    async def get(self, request):
+        return JsonResponse({"status": "ok"}, status=status.HTTP_200_OK)
+
+
+class ReadinessView(AsyncAPIView):
+    async def get(self, request):
+        result = await sync_to_async(readiness_probe.check_with_stats)()
+        code = status.HTTP_200_OK if result['status'] == 'ok' else status.HTTP_503_SERVICE_UNAVAILABLE
+        return JsonResponse(result, status=code)
@@ -0,0 +1,123 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch, get_md5_hash_password
+
+from core.metrics import registry
+
+from .activity import tracker
+from .cache import TTLCache
+
+AUTH_CACHE_TTL = getattr(settings, 'AUTH_CACHE_TTL', 30)
+AUTH_CACHE_MAXSIZE = getattr(settings, 'AUTH_CACHE_MAXSIZE', 10000)
+
+# Раскодированные токены по sha256 от raw-токена и пользователи по id.
+# Кэш живёт в памяти воркера, записи пользователей сбрасываются сигналами
+# (см. accounts.signals), в других воркерах они доживают максимум TTL.
+token_cache = TTLCache(AUTH_CACHE_MAXSIZE, AUTH_CACHE_TTL)
+user_cache = TTLCache(AUTH_CACHE_MAXSIZE, AUTH_CACHE_TTL)
+
+
+def invalidate_user(user_id):
+    user_cache.delete(str(user_id))
+
+
+def auth_cache_stats():
+    return {'tokens': token_cache.stats(), 'users': user_cache.stats()}
+
+
+@registry.collector
+def auth_cache_metrics():
+    for name, stats in auth_cache_stats().items():
+        yield 'auth_cache_hits_total', (('cache', name),), stats['hits']
+        yield 'auth_cache_misses_total', (('cache', name),), stats['misses']
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that skips token decoding and the user query for
+    tokens and users seen recently by this worker.
+
+    ``request.user`` is a copy of a cached snapshot that may be up to
+    ``AUTH_CACHE_TTL`` seconds old: treat it as read-only. Views that write
+    the user reload it from the primary and save only the changed fields.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # last_seen пишется пачкой в фоне (accounts.activity)
+            tracker.seen(result[0].pk)
+        return result
+
+    def get_validated_token(self, raw_token):
+        key = hashlib.sha256(raw_token).hexdigest()
+        validated_token = token_cache.get(key)
+        if validated_token is None:
+            validated_token = super().get_validated_token(raw_token)
+            # Токен не должен пережить свой exp в кэше
+            expires_in = (datetime_from_epoch(validated_token['exp']) - aware_utcnow()).total_seconds()
+            token_cache.set(key, validated_token, ttl=expires_in)
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, copy.copy(user), generation=generation)
+            return user
+
+        self.check_revoked(user, validated_token)
+        # Копия, чтобы view не мог изменить общий экземпляр
+        return copy.copy(user)
+
+    def check_revoked(self, user, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: the token check is CPU-only, the user comes from the async ORM."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.aget_user(validated_token)
+        tracker.seen(user.pk)
+        return user, validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            try:
+                user = await self.user_model.objects.aget(
+                    **{api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            if not user.is_active:
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            user_cache.set(user_id, copy.copy(user), generation=generation)
+
+        self.check_revoked(user, validated_token)
+        return copy.copy(user)
@@ -0,0 +1,82 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_backends, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+
+from .permission_cache import permission_cache
+
+User = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    """
+    ModelBackend that finds the user by email without regard to case,
+    through the unique index on LOWER(email).
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        email = email or username
+        if email is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_email(email)
+        except User.DoesNotExist:
+            # Хешируем и для несуществующего пользователя, чтобы время ответа
+            # не выдавало, зарегистрирован ли email
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, email=None, **kwargs):
+        email = email or username
+        if email is None or password is None:
+            return None
+        try:
+            user = await User._default_manager.aget_by_email(email)
+        except User.DoesNotExist:
+            await User().aset_password(password)
+            return None
+        if await user.acheck_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        # Как в ModelBackend, но наборы прав берутся из кэша воркера
+        # (accounts.permission_cache), а не запросами на каждый новый экземпляр
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        perm_cache_name = '_%s_perm_cache' % from_name
+        if not hasattr(user_obj, perm_cache_name):
+            if user_obj.is_superuser:
+                perms = permission_cache.all_permissions()
+            elif from_name == 'user':
+                perms = permission_cache.user_permissions(user_obj.pk)
+            else:
+                perms = permission_cache.group_permissions(user_obj.pk)
+            setattr(user_obj, perm_cache_name, set(perms))
+        return getattr(user_obj, perm_cache_name)
+
+
+async def aauthenticate(request=None, **credentials):
+    """
+    authenticate() for async views.
+
+    django.contrib.auth.aauthenticate in Django 5.0 runs the sync backends
+    through sync_to_async, i.e. all logins of a worker in one thread. Backends
+    with their own ``aauthenticate`` are awaited directly instead.
+    """
+    for backend in get_backends():
+        if hasattr(backend, 'aauthenticate'):
+            user = await backend.aauthenticate(request, **credentials)
+        else:
+            user = await sync_to_async(backend.authenticate)(request, **credentials)
+        if user is not None:
+            user.backend = f'{type(backend).__module__}.{type(backend).__qualname__}'
+            return user
+
+    credentials = {key: value for key, value in credentials.items() if key != 'password'}
+    await user_login_failed.asend(sender=__name__, credentials=credentials, request=request)
+    return None
@@ -0,0 +1,233 @@
+"""
+Load benchmark of the auth endpoints (see the ``bench_auth`` command).
+
+Requests go either in-process through ``django.test.Client`` or over HTTP
+to a running server (``base_url``), from ``concurrency`` threads. Queries
+per request are taken from the Server-Timing header that
+core.middleware.MetricsMiddleware adds, so both modes count them the same way.
+"""
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from .blacklist import blacklist_index
+from .hashing import make_password
+from .health import percentile
+from .tokens import RefreshToken
+
+User = get_user_model()
+
+BENCH_EMAIL_DOMAIN = 'bench.invalid'
+BENCH_PASSWORD = 'Bench-pass-12345'
+
+# Максимум SQL-запросов на один вызов эндпоинта. Проверяется тестами
+# (accounts.tests.QueryBudgetTests) и командой bench_auth
+QUERY_BUDGETS = {
+    'login': 2,
+    'refresh': 0,
+    'register': 3,
+}
+
+
+def query_budget(endpoint):
+    budget = QUERY_BUDGETS.get(endpoint)
+    if endpoint == 'refresh' and not blacklist_index.shared:
+        # Без общего кэша промах по индексу чёрного списка проверяется в таблице
+        budget += 1
+    return budget
+
+
+ENDPOINTS = {
+    'login': 'auth_login',
+    'refresh': 'token_refresh',
+    'register': 'auth_register',
+}
+
+# Async-варианты (accounts.async_views); refresh остаётся на sync-view simplejwt
+ASYNC_ENDPOINTS = dict(ENDPOINTS, login='async_auth_login', register='async_auth_register')
+
+_DB_TIMING = re.compile(r'(?:^|,\s*)db;dur=[\d.]+;desc="(\d+)"')
+
+
+def queries_from_server_timing(header):
+    if header is None:
+        return None
+    match = _DB_TIMING.search(header)
+    return int(match.group(1)) if match else 0
+
+
+def seed_users(count):
+    """Creates ``count`` bench users (all sharing one password hash) unless they exist."""
+    emails = [f'user{i}@{BENCH_EMAIL_DOMAIN}' for i in range(count)]
+    existing = set(User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').values_list('email', flat=True))
+    password = make_password(BENCH_PASSWORD)
+    User.objects.bulk_create(
+        [User(email=email, password=password) for email in emails if email not in existing],
+        batch_size=1000,
+    )
+    return list(User.objects.filter(email__in=emails).order_by('pk'))
+
+
+def cleanup():
+    users = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+    OutstandingToken.objects.filter(user__in=users).delete()
+    return users.delete()[0]
+
+
+def build_payloads(endpoint, users, requests):
+    if endpoint == 'login':
+        return [{'email': users[i % len(users)].email, 'password': BENCH_PASSWORD} for i in range(requests)]
+    if endpoint == 'refresh':
+        # Токены выпускаются до замера; без ROTATE_REFRESH_TOKENS их можно переиспользовать
+        tokens = [str(RefreshToken.for_user(user)) for user in users[:requests]]
+        return [{'refresh': tokens[i % len(tokens)]} for i in range(requests)]
+    if endpoint == 'register':
+        run = uuid.uuid4().hex[:8]
+        return [{'email': f'reg-{run}-{i}@{BENCH_EMAIL_DOMAIN}', 'password': BENCH_PASSWORD,
+                 'password2': BENCH_PASSWORD} for i in range(requests)]
+    raise ValueError(f'unknown endpoint {endpoint!r}')
+
+
+class _ClientSender:
+    def __init__(self):
+        # Ошибки view превращаются в 500 и считаются, а не прерывают прогон
+        self.client = Client(raise_request_exception=False)
+        self.sent = 0
+
+    def __call__(self, path, payload):
+        # Клиенты с разных адресов (198.18.0.0/15 - для бенчмарков), иначе
+        # весь прогон упрётся в лимит входов с одного IP (accounts.throttling).
+        # Для --url адрес бенчмарка добавляют в LOGIN_THROTTLE_TRUSTED_IPS сервера.
+        self.sent += 1
+        address = f'198.18.{self.sent // 256 % 256}.{self.sent % 256}'
+        response = self.client.post(path, payload, content_type='application/json', REMOTE_ADDR=address)
+        return response.status_code, response.headers.get('Server-Timing')
+
+
+class _HTTPSender:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def __call__(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode(), method='POST',
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Server-Timing')
+        except OSError:
+            return 0, None
+
+
+def run_endpoint(endpoint, payloads, concurrency=1, base_url=None, use_async=False):
+    path = reverse((ASYNC_ENDPOINTS if use_async else ENDPOINTS)[endpoint])
+    results = []
+
+    def worker(chunk):
+        send = _HTTPSender(base_url) if base_url else _ClientSender()
+        try:
+            for payload in chunk:
+                started = time.perf_counter()
+                status, timing = send(path, payload)
+                results.append((time.perf_counter() - started, status, queries_from_server_timing(timing)))
+        finally:
+            connections.close_all()
+
+    # Прогрев: пул хеширования, соединение с БД, импорты
+    # (для регистрации нужен свой email, иначе первый запрос замера получит 400)
+    worker(build_payloads(endpoint, [], 1) if endpoint == 'register' else payloads[:1])
+    results.clear()
+
+    threads = [threading.Thread(target=worker, args=(payloads[i::concurrency],)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(endpoint, results, time.perf_counter() - started, concurrency)
+
+
+def summarize(endpoint, results, elapsed, concurrency):
+    latencies = [latency * 1000 for latency, _, _ in results]
+    queries = [count for _, _, count in results if count is not None]
+    budget = query_budget(endpoint)
+    max_queries = max(queries) if queries else None
+    return {
+        'endpoint': endpoint,
+        'requests': len(results),
+        'errors': sum(1 for _, status, _ in results if not 200 <= status < 300),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(results) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': _round(percentile(latencies, 50)),
+            'p95': _round(percentile(latencies, 95)),
+            'p99': _round(percentile(latencies, 99)),
+            'max': _round(max(latencies, default=None)),
+        },
+        'queries_per_request': {
+            'avg': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max_queries,
+        },
+        'query_budget': budget,
+        'over_budget': budget is not None and max_queries is not None and max_queries > budget,
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def compare(previous, current):
+    """Per-endpoint change between two saved reports, in percent (latency, rps) and queries."""
+    diff = {}
+    for endpoint, now in current['results'].items():
+        before = previous.get('results', {}).get(endpoint)
+        if before is None:
+            continue
+        diff[endpoint] = {
+            'rps': _change(before['rps'], now['rps']),
+            'p95_ms': _change(before['latency_ms']['p95'], now['latency_ms']['p95']),
+            'p99_ms': _change(before['latency_ms']['p99'], now['latency_ms']['p99']),
+            'queries_per_request': _delta(before['queries_per_request']['avg'], now['queries_per_request']['avg']),
+        }
+    return diff
+
+
+def _change(before, after):
+    if not before or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return round(after - before, 2)
+
+
+def describe_database():
+    connection = connections['default']
+    return {'vendor': connection.vendor, 'name': str(connection.settings_dict['NAME']),
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE')}
+
+
+def describe_settings():
+    return {'password_hashing_workers': getattr(settings, 'PASSWORD_HASHING_WORKERS', None),
+            'password_hashers': settings.PASSWORD_HASHERS[:1],
+            'login_throttle_store': getattr(settings, 'LOGIN_THROTTLE_STORE', None)}
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .cache import is_shared
+
+BLACKLIST_INDEX_CACHE = getattr(settings, 'BLACKLIST_INDEX_CACHE', 'default')
+BLACKLIST_INDEX_SYNC_INTERVAL = getattr(settings, 'BLACKLIST_INDEX_SYNC_INTERVAL', 30)
+BLACKLIST_INDEX_REBUILD_INTERVAL = getattr(settings, 'BLACKLIST_INDEX_REBUILD_INTERVAL', 600)
+
+VERSION_KEY = 'accounts:blacklist-index:version'
+
+# Строки BlacklistedToken с меньшим id могут закоммититься позже строк с
+# большим. Инкрементальная синхронизация перечитывает хвост за это окно.
+SYNC_OVERLAP = 10
+
+
+class BlacklistIndex:
+    """Per-worker set of blacklisted JTIs backed by the BlacklistedToken table.
+
+    A JTI found in the set is blacklisted. A JTI that is not found is only
+    trusted if the set is fresh: the index reads a version counter from the
+    shared cache (``BLACKLIST_INDEX_CACHE``) and pulls new rows from the
+    database when another worker has bumped it, when ``sync_interval`` has
+    passed, or rebuilds completely after ``rebuild_interval``. With the
+    default local-memory cache the counter is per process and other
+    workers' blacklists would go unnoticed, so a miss is then checked in
+    the database; point the alias at Redis or Memcached to skip that query.
+    """
+
+    def __init__(self, cache_alias=BLACKLIST_INDEX_CACHE, sync_interval=BLACKLIST_INDEX_SYNC_INTERVAL,
+                 rebuild_interval=BLACKLIST_INDEX_REBUILD_INTERVAL):
+        self.cache_alias = cache_alias
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._jtis = set()
+        self._marks = deque()  # (время синхронизации, максимальный id)
+        self._version = None
+        self._synced_at = None
+        self._rebuilt_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def shared(self):
+        # Версию в памяти процесса другие воркеры не увидят
+        return is_shared(self.cache)
+
+    def __len__(self):
+        return len(self._jtis)
+
+    def __contains__(self, jti):
+        if jti in self._jtis:
+            return True
+        if not self.shared:
+            if BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).filter(token__jti=jti).exists():
+                self._jtis.add(jti)
+                return True
+            return False
+        if self._is_stale():
+            self.sync()
+            return jti in self._jtis
+        return False
+
+    def _is_stale(self):
+        if self._synced_at is None:
+            return True
+        if time.monotonic() - self._synced_at > self.sync_interval:
+            return True
+        return self.cache.get(VERSION_KEY) != self._version
+
+    def sync(self, rebuild=False):
+        with self._lock:
+            now = time.monotonic()
+            version = self.cache.get(VERSION_KEY)
+            rebuild = rebuild or self._rebuilt_at is None or now - self._rebuilt_at > self.rebuild_interval
+
+            # С primary: синхронизацию запускает новая версия, а реплика может
+            # ещё не получить строки, ради которых её подняли
+            rows = BlacklistedToken.objects.using(DEFAULT_DB_ALIAS).order_by('pk').values_list('pk', 'token__jti')
+            if rebuild:
+                jtis = set()
+                self._marks.clear()
+                # Полная загрузка считается надёжной сразу
+                mark_time = now - SYNC_OVERLAP
+            else:
+                jtis = self._jtis
+                rows = rows.filter(pk__gt=self._floor(now))
+                mark_time = now
+
+            last_id = self._marks[-1][1] if self._marks else 0
+            for pk, jti in rows.iterator():
+                jtis.add(jti)
+                last_id = max(last_id, pk)
+
+            self._jtis = jtis
+            self._marks.append((mark_time, last_id))
+            self._version = version
+            self._synced_at = now
+            if rebuild:
+                self._rebuilt_at = now
+
+    def _floor(self, now):
+        """Highest id seen by a sync that is at least SYNC_OVERLAP seconds old."""
+        floor = None
+        while self._marks and now - self._marks[0][0] >= SYNC_OVERLAP:
+            floor = self._marks.popleft()[1]
+        if floor is None:
+            return 0
+        # Последняя «старая» отметка остаётся нижней границей
+        self._marks.appendleft((now - SYNC_OVERLAP, floor))
+        return floor
+
+    def add(self, *jtis):
+        self._jtis.update(jtis)
+        version = self._bump()
+        # Если между нашими версиями никто не писал, своя запись уже в наборе
+        if version is not None and self._version is not None and version == self._version + 1:
+            self._version = version
+
+    def notify(self):
+        """Tells the other workers (and this one) that the blacklist table has new rows."""
+        self._bump()
+
+    def _bump(self):
+        cache = self.cache
+        cache.add(VERSION_KEY, 0, timeout=None)
+        try:
+            return cache.incr(VERSION_KEY)
+        except ValueError:
+            # Ключ вытеснен между add и incr
+            cache.set(VERSION_KEY, 1, timeout=None)
+            return None
+
+    def reset(self):
+        with self._lock:
+            self._jtis = set()
+            self._marks.clear()
+            self._version = self._synced_at = self._rebuilt_at = None
+
+
+blacklist_index = BlacklistIndex()
+
+
+def is_blacklisted(jti):
+    return jti in blacklist_index
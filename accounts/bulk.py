@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth import get_user_model, hashers
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+User = get_user_model()
+
+# Колонки файлов import_users/export_users. password - уже готовый хеш в
+# формате Django (algorithm$...), raw_password - пароль открытым текстом.
+USER_FIELDS = ['email', 'password', 'first_name', 'last_name', 'phone', 'address',
+               'is_active', 'is_staff', 'date_joined']
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(path, default='csv'):
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    if ext in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if ext == 'csv':
+        return 'csv'
+    return default
+
+
+class RateMeter:
+    """Counts rows and reports rows/sec since start."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return f'{self.rows} rows, {self.rate:.0f} rows/s'
+
+
+def _lines(stream):
+    # readline() вместо итерации по файлу, чтобы tell() оставался доступен
+    return iter(stream.readline, '')
+
+
+def read_records(stream, fmt, offset=0):
+    """Yields ``(record, offset)`` pairs where ``offset`` points right after the record.
+
+    Memory use does not depend on the file size. ``offset`` can be passed
+    back to resume reading a seekable file after that record; for pipes it
+    is always None.
+    """
+    tell = stream.tell if stream.seekable() else lambda: None
+    if fmt == 'csv':
+        reader = csv.reader(_lines(stream))
+        header = next(reader, None)
+        if header is None:
+            return
+        if offset:
+            stream.seek(offset)
+        for row in reader:
+            if row:
+                yield dict(zip(header, row)), tell()
+    else:
+        if offset:
+            stream.seek(offset)
+        for line in _lines(stream):
+            if line.strip():
+                yield json.loads(line), tell()
+
+
+def _parse_bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+
+def build_user(record, now):
+    """Turns an input record into an unsaved CustomUser, or raises ValueError."""
+    email = (record.get('email') or '').strip()
+    if not email:
+        raise ValueError('email is required')
+
+    password = record.get('password') or ''
+    if password:
+        try:
+            hashers.identify_hasher(password)
+        except ValueError:
+            raise ValueError(f'unknown password hash format for {email}')
+    elif not record.get('raw_password'):
+        password = hashers.make_password(None)
+
+    date_joined = record.get('date_joined') or None
+    if isinstance(date_joined, str):
+        date_joined = parse_datetime(date_joined)
+    if date_joined and timezone.is_naive(date_joined):
+        date_joined = timezone.make_aware(date_joined, dt_timezone.utc)
+
+    return User(
+        email=User.objects.normalize_email(email),
+        password=password,
+        first_name=record.get('first_name') or None,
+        last_name=record.get('last_name') or None,
+        phone=record.get('phone') or None,
+        address=record.get('address') or None,
+        is_active=_parse_bool(record.get('is_active'), True),
+        is_staff=_parse_bool(record.get('is_staff'), False),
+        date_joined=date_joined or now,
+    )
+
+
+@contextmanager
+def keep_date_joined():
+    # date_joined - auto_now_add, bulk_create перезаписал бы его текущим временем
+    field = User._meta.get_field('date_joined')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def insert_batch(users):
+    """Inserts ``users`` with one multi-row INSERT, skipping emails that already exist."""
+    with keep_date_joined():
+        User.objects.bulk_create(users, batch_size=len(users), ignore_conflicts=True)
+
+
+def copy_batch(users):
+    """PostgreSQL COPY into a temporary table, then INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+
+    Returns the number of inserted rows.
+    """
+    # Все колонки, кроме id: у is_superuser, version и других нет DEFAULT в БД,
+    # значения по умолчанию модели передаются явно. NULL - \N, чтобы пустая
+    # строка оставалась пустой строкой
+    fields = [field for field in User._meta.concrete_fields if not field.primary_key]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for user in users:
+        values = (field.get_db_prep_save(getattr(user, field.attname), connection) for field in fields)
+        writer.writerow(['\\N' if value is None else value for value in values])
+    buffer.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(User._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE import_users ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        raw = cursor.cursor
+        sql = f"COPY import_users ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, buffer)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(buffer.read())
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM import_users ON CONFLICT DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+def supports_copy():
+    return connection.vendor == 'postgresql'
+
+
+def load_checkpoint(path, source):
+    if not path or not os.path.exists(path):
+        return {'source': source, 'offset': 0, 'rows': 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('source') != source:
+        raise ValueError(f'checkpoint {path} belongs to {checkpoint.get("source")}')
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
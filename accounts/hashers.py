@@ -0,0 +1,41 @@
+"""
+Django's password hashers with the cost taken from ``PASSWORD_HASHER_PARAMS``.
+
+The algorithm names are unchanged, so stored hashes keep verifying; when the
+configured cost differs from a stored hash, ``must_update`` is true and the
+hash is upgraded on the next login (see ``accounts.hashing.Rehasher``).
+The parameters for the machine are picked by ``calibrate_hashers``.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+PASSWORD_HASHER_PARAMS = getattr(settings, 'PASSWORD_HASHER_PARAMS', {})
+
+
+def _param(algorithm, name, default):
+    value = PASSWORD_HASHER_PARAMS.get(algorithm, {}).get(name)
+    return int(value) if value else default
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = _param('pbkdf2_sha256', 'iterations', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = _param('argon2', 'time_cost', hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = _param('argon2', 'memory_cost', hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = _param('argon2', 'parallelism', hashers.Argon2PasswordHasher.parallelism)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = _param('scrypt', 'work_factor', hashers.ScryptPasswordHasher.work_factor)
+    block_size = _param('scrypt', 'block_size', hashers.ScryptPasswordHasher.block_size)
+    # OpenSSL по умолчанию ограничивает scrypt 32 МиБ, а нужно 128 * N * r
+    maxmem = 2 * 128 * work_factor * block_size
+
+
+HASHERS = {
+    'pbkdf2_sha256': PBKDF2PasswordHasher,
+    'argon2': Argon2PasswordHasher,
+    'scrypt': ScryptPasswordHasher,
+}
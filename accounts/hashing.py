@@ -0,0 +1,223 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.db import close_old_connections
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASHING_WORKERS = getattr(settings, 'PASSWORD_HASHING_WORKERS', 2)
+PASSWORD_HASHING_QUEUE_SIZE = getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 32)
+PASSWORD_HASHING_RETRY_AFTER = getattr(settings, 'PASSWORD_HASHING_RETRY_AFTER', 1)
+
+
+class HashingPoolBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please retry later.'
+    default_code = 'hashing_pool_busy'
+
+    def __init__(self, wait=PASSWORD_HASHING_RETRY_AFTER):
+        super().__init__()
+        # DRF выставит заголовок Retry-After
+        self.wait = wait
+
+
+_fail_fast = contextvars.ContextVar('hashing_fail_fast', default=False)
+
+
+@contextmanager
+def fail_fast():
+    """Makes a full pool raise :class:`HashingPoolBusy` inside the block.
+
+    Used by the API views, which turn it into 503 with Retry-After. Elsewhere
+    (admin login, password forms, management commands) nothing handles the
+    exception, so there a full pool hashes inline on the calling thread.
+    """
+    token = _fail_fast.set(True)
+    try:
+        yield
+    finally:
+        _fail_fast.reset(token)
+
+
+class HashingPool:
+    """Process pool for password hashing with a bounded number of pending jobs.
+
+    ``workers`` processes hash in parallel and up to ``queue_size`` more jobs
+    may wait for them. Beyond that, inside :func:`fail_fast` a job raises
+    :class:`HashingPoolBusy` right away instead of queueing behind a login
+    burst; outside it runs inline. With ``workers=0`` hashing always runs
+    inline on the calling thread.
+    """
+
+    def __init__(self, workers=PASSWORD_HASHING_WORKERS, queue_size=PASSWORD_HASHING_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not self.workers:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn, а не fork: воркеры gunicorn многопоточные
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, fn, *args):
+        if not self.workers:
+            return self._inline(fn, *args)
+
+        if not self._slots.acquire(blocking=False):
+            return self._busy(fn, *args)
+        try:
+            future = self.start().submit(fn, *args)
+        except BrokenProcessPool:
+            # Процесс пула упал - пересоздаём пул при следующем вызове
+            self._slots.release()
+            self.shutdown()
+            return self._busy(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def _busy(self, fn, *args):
+        if _fail_fast.get():
+            raise HashingPoolBusy()
+        metrics.registry.inc('password_hashing_inline_total', ())
+        return self._inline(fn, *args)
+
+    def _inline(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def reset_after_fork(self):
+        # Процессы пула и его служебные потоки остались у родителя
+        # (например, мастера gunicorn с preload_app)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size) if self.workers else None
+
+
+pool = HashingPool()
+os.register_at_fork(after_in_child=pool.reset_after_fork)
+
+
+def make_password(password):
+    if password is None:
+        return hashers.make_password(None)
+    with metrics.timed('hash'):
+        return pool.submit(hashers.make_password, password).result()
+
+
+def verify_password(password, encoded):
+    """Returns ``(is_correct, must_update)`` like :func:`django.contrib.auth.hashers.verify_password`."""
+    if password is None or not hashers.is_password_usable(encoded):
+        return False, False
+    with metrics.timed('hash'):
+        return pool.submit(hashers.verify_password, password, encoded).result()
+
+
+async def amake_password(password):
+    if password is None:
+        return hashers.make_password(None)
+    with metrics.timed('hash'):
+        return await asyncio.wrap_future(pool.submit(hashers.make_password, password))
+
+
+async def averify_password(password, encoded):
+    if password is None or not hashers.is_password_usable(encoded):
+        return False, False
+    with metrics.timed('hash'):
+        return await asyncio.wrap_future(pool.submit(hashers.verify_password, password, encoded))
+
+
+class Rehasher:
+    """Upgrades outdated password hashes after a successful login, off the request path.
+
+    The login answers as soon as the password is verified; the new hash is
+    computed on the hashing pool from a single background thread and written
+    only if the stored hash is still the one that was verified, so a password
+    changed in the meantime is never overwritten. If the pool is busy the
+    upgrade is skipped and happens on a later login.
+    """
+
+    def __init__(self, queue_size=PASSWORD_HASHING_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._pending = set()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def schedule(self, user, raw_password):
+        with self._lock:
+            if user.pk in self._pending or len(self._pending) >= self.queue_size:
+                return False
+            self._pending.add(user.pk)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+            self._executor.submit(self._rehash, type(user), user.pk, raw_password, user.password)
+        return True
+
+    def _rehash(self, model, pk, raw_password, encoded):
+        # Здесь, а не в начале модуля: authentication импортирует модели, а они - этот модуль
+        from .authentication import invalidate_user
+
+        try:
+            close_old_connections()
+            # Занятый пул - пропускаем, пересчитаем на следующем входе
+            with fail_fast():
+                password = make_password(raw_password)
+            # queryset.update(): это не смена пароля и не правка профиля (version)
+            if model._default_manager.filter(pk=pk, password=encoded).update(password=password):
+                invalidate_user(pk)
+        except HashingPoolBusy:
+            pass
+        except Exception:
+            logger.exception('Cannot upgrade the password hash of user %s', pk)
+        finally:
+            with self._lock:
+                self._pending.discard(pk)
+
+    def wait(self):
+        """Finishes the scheduled upgrades (worker shutdown, tests)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def reset_after_fork(self):
+        self._pending = set()
+        self._executor = None
+        self._lock = threading.Lock()
+
+
+rehasher = Rehasher()
+os.register_at_fork(after_in_child=rehasher.reset_after_fork)
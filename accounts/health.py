@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from core.dbstats import connection_stats
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_CACHE_SECONDS = getattr(settings, 'HEALTH_CHECK_CACHE_SECONDS', 5)
+HEALTH_CHECK_SLOW_MS = getattr(settings, 'HEALTH_CHECK_SLOW_MS', 200)
+HEALTH_CHECK_MIGRATIONS_CACHE_SECONDS = getattr(settings, 'HEALTH_CHECK_MIGRATIONS_CACHE_SECONDS', 60)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class ReadinessProbe:
+    """Database readiness check whose result is reused for ``ttl`` seconds.
+
+    However often the orchestrator asks, a worker runs at most one
+    ``SELECT 1`` per ``ttl`` and one migration check per
+    ``migrations_ttl``. Latencies of the real probes are kept in a rolling
+    window for percentiles.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, ttl=HEALTH_CHECK_CACHE_SECONDS, slow_ms=HEALTH_CHECK_SLOW_MS,
+                 migrations_ttl=HEALTH_CHECK_MIGRATIONS_CACHE_SECONDS, window=100):
+        self.using = using
+        self.ttl = ttl
+        self.slow_ms = slow_ms
+        self.migrations_ttl = migrations_ttl
+        self.latencies = deque(maxlen=window)
+        self._result = None
+        self._checked_at = None
+        self._pending_migrations = None
+        self._migrations_checked_at = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.ttl:
+                self._result = self._probe(now)
+                self._checked_at = now
+            return dict(self._result, cached_for=round(now - self._checked_at, 3))
+
+    def _probe(self, now):
+        connection = connections[self.using]
+        db = {
+            'connection_reused': connection.connection is not None,
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+        }
+        started = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        except DatabaseError:
+            logger.exception('Readiness probe: database is unavailable')
+            db['status'] = 'down'
+            return {'status': 'error', 'db': db}
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.latencies.append(latency_ms)
+        db.update({
+            'status': 'slow' if latency_ms > self.slow_ms else 'ok',
+            'latency_ms': round(latency_ms, 2),
+            'p50_ms': round(percentile(self.latencies, 50), 2),
+            'p95_ms': round(percentile(self.latencies, 95), 2),
+            'p99_ms': round(percentile(self.latencies, 99), 2),
+        })
+
+        pending = self._check_migrations(connection, now)
+        status = 'ok' if pending == 0 else 'error'
+        return {'status': status, 'db': db, 'migrations': {'pending': pending}}
+
+    def check_with_stats(self):
+        result = self.check()
+        # Счётчики соединений живые, их не кэшируем
+        result['connections'] = connection_stats(self.using)
+        return result
+
+    def _check_migrations(self, connection, now):
+        # Набор миграций меняется только при деплое - проверяем редко
+        if self._migrations_checked_at is None or now - self._migrations_checked_at >= self.migrations_ttl:
+            try:
+                executor = MigrationExecutor(connection)
+                plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+                self._pending_migrations = len(plan)
+            except DatabaseError:
+                logger.exception('Readiness probe: cannot read migration state')
+                self._pending_migrations = None
+            self._migrations_checked_at = now
+        return self._pending_migrations
+
+
+readiness_probe = ReadinessProbe()
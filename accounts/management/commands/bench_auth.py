@@ -0,0 +1,79 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Load-tests the auth endpoints and reports p50/p95/p99 latency, requests/sec and '
+            'queries per request. Seeds bench users (@bench.invalid) in the configured database; '
+            'use DB_ENGINE=sqlite for a local stand-in.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Bench users to seed.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads.')
+        parser.add_argument('--endpoint', action='append', choices=sorted(benchmark.ENDPOINTS),
+                            help='Endpoint to run, may be repeated. Default: all.')
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000. '
+                                          'Default: requests are handled in-process.')
+        parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='Use the async views (accounts.async_views). Compare with the sync run '
+                                 'against an ASGI server (--url) to see the concurrency difference.')
+        parser.add_argument('--output', help='Write the JSON report to this file.')
+        parser.add_argument('--compare', help='Previous JSON report to compare against.')
+        parser.add_argument('--fail-over-budget', action='store_true',
+                            help='Exit with an error if an endpoint exceeds its query budget.')
+        parser.add_argument('--cleanup', action='store_true', help='Delete bench users afterwards.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--users, --requests and --concurrency must be positive')
+
+        users = benchmark.seed_users(options['users'])
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': benchmark.describe_database(),
+            'settings': benchmark.describe_settings(),
+            'url': options['url'],
+            'async': options['use_async'],
+            'users': len(users),
+            'results': {},
+        }
+        try:
+            for endpoint in options['endpoint'] or list(benchmark.ENDPOINTS):
+                payloads = benchmark.build_payloads(endpoint, users, options['requests'])
+                result = benchmark.run_endpoint(endpoint, payloads, options['concurrency'], options['url'],
+                                                options['use_async'])
+                report['results'][endpoint] = result
+                self.stdout.write(self.format_result(result))
+        finally:
+            if options['cleanup']:
+                self.stdout.write(f'Deleted {benchmark.cleanup()} bench objects')
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                report['compare'] = benchmark.compare(json.load(f), report)
+            for endpoint, diff in report['compare'].items():
+                self.stdout.write(f'{endpoint:<10} vs previous: ' + ', '.join(f'{k} {v:+}' for k, v in diff.items()
+                                                                                 if v is not None))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        over = [name for name, result in report['results'].items() if result['over_budget']]
+        if over and options['fail_over_budget']:
+            raise CommandError(f'Query budget exceeded: {", ".join(over)}')
+
+    def format_result(self, result):
+        latency = result['latency_ms']
+        queries = result['queries_per_request']
+        line = (f"{result['endpoint']:<10} {result['requests']} req, {result['errors']} errors, "
+                f"{result['rps']} req/s, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+                f"p99 {latency['p99']} ms, {queries['avg']} queries/req (budget {result['query_budget']})")
+        return self.style.ERROR(line) if result['over_budget'] or result['errors'] else line
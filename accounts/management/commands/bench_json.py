@@ -0,0 +1,65 @@
+import io
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.parsers import ORJSONParser, orjson
+from core.renderers import ORJSONRenderer
+
+
+def payloads():
+    refresh = RefreshToken()
+    refresh['user_id'] = 1
+    tokens = {'access': str(refresh.access_token), 'refresh': str(refresh)}
+    user = {'email': 'anna.petrova@example.com', 'full_name': 'Анна Петрова', 'phone': '+79991234567',
+            'address': 'Москва, ул. Тверская, 1'}
+    return {
+        'login': dict(tokens, user=user),
+        'register': dict(tokens, user={'email': user['email'], 'first_name': 'Анна', 'last_name': 'Петрова'}),
+        'token_refresh': {'access': tokens['access']},
+        'validation_error': {'email': [ErrorDetail('User with this Email already exists.', code='unique')],
+                             'password': [_('This field is required.')]},
+        'readiness': {'status': 'ok', 'checked_at': timezone.now(), 'cached_for': 1.234,
+                      'db': {'status': 'ok', 'latency_ms': Decimal('0.52'), 'p95_ms': 1.75},
+                      'uptime': timedelta(hours=5)},
+        'user_list': [dict(user, id=i, date_joined=timezone.now()) for i in range(100)],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compares DRF JSONRenderer/JSONParser with the orjson ones (core.renderers) on our API payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000, help='Iterations per measurement.')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed: the fast classes fall back to DRF ones'))
+        number = options['number']
+        stdlib_renderer, fast_renderer = JSONRenderer(), ORJSONRenderer()
+        stdlib_parser, fast_parser = JSONParser(), ORJSONParser()
+
+        self.stdout.write(f"{'payload':<18} {'bytes':>6} {'render us':>18} {'parse us':>18} identical")
+        for name, data in payloads().items():
+            body = stdlib_renderer.render(data)
+            n = max(number // max(len(body) // 1000, 1), 100)
+            render = [timeit.timeit(lambda: r.render(data), number=n) / n * 1e6
+                      for r in (stdlib_renderer, fast_renderer)]
+            parse = [timeit.timeit(lambda: p.parse(io.BytesIO(body)), number=n) / n * 1e6
+                     for p in (stdlib_parser, fast_parser)]
+            identical = fast_renderer.render(data) == body and fast_parser.parse(io.BytesIO(body)) == \
+                stdlib_parser.parse(io.BytesIO(body))
+            self.stdout.write(f'{name:<18} {len(body):>6} {self.format(*render):>18} {self.format(*parse):>18} '
+                              f'{identical}')
+
+    @staticmethod
+    def format(stdlib, fast):
+        return f'{stdlib:.1f}->{fast:.1f} x{stdlib / fast:.1f}'
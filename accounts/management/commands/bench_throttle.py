@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from accounts.throttling import LocalStore, LoginThrottle
+
+
+class Command(BaseCommand):
+    help = ('Measures the per-request cost of the login throttle check (accounts.throttling) '
+            'with the local store and with LOGIN_THROTTLE_STORE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=50000, help='Checks per measurement.')
+        parser.add_argument('--clients', type=int, default=10000, help='Distinct IPs and emails.')
+
+    def handle(self, *args, **options):
+        number, clients = options['number'], options['clients']
+        idents = [f'198.18.{i // 256 % 256}.{i % 256}' for i in range(clients)]
+        emails = [f'user{i}@bench.invalid' for i in range(clients)]
+
+        stores = {'local': LocalStore}
+        if settings.LOGIN_THROTTLE_STORE != 'accounts.throttling.LocalStore':
+            stores[settings.LOGIN_THROTTLE_STORE] = import_string(settings.LOGIN_THROTTLE_STORE)
+
+        self.stdout.write(f"{'store':<36} {'allowed us':>10} {'rejected us':>11} {'keys':>7}")
+        for name, store_class in stores.items():
+            # Без лимита: каждая проверка доходит до счётчиков обоих ключей
+            store = store_class()
+            allowed = self.measure(LoginThrottle(store=store, ip_limit=number, email_limit=number),
+                                   idents, emails, number)
+            # Лимит 0: все ключи заблокированы, проверка отвечает по ключу блокировки
+            rejected = self.measure(LoginThrottle(store=store_class(), ip_limit=0, email_limit=0),
+                                    idents, emails, number)
+            keys = len(store) if hasattr(store, '__len__') else '-'
+            self.stdout.write(f'{name:<36} {allowed:>10.2f} {rejected:>11.2f} {keys:>7}')
+
+    def measure(self, throttle, idents, emails, number):
+        clients = len(idents)
+        started = time.perf_counter()
+        for i in range(number):
+            throttle.check(idents[i % clients], emails[i % clients])
+        return (time.perf_counter() - started) / number * 1e6
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.schema import schema_cache
+
+
+class Command(BaseCommand):
+    help = ('Generates the OpenAPI schema served at /api/schema/ into SCHEMA_CACHE_DIR '
+            'for the current code version (run at image build).')
+
+    def handle(self, *args, **options):
+        rendered = schema_cache.build()
+        for fmt, schema in rendered.items():
+            self.stdout.write(f'{schema_cache.path(fmt)}: {len(schema.body)} bytes, '
+                              f'{len(schema.gzipped)} gzipped, ETag {schema.etag}')
@@ -0,0 +1,139 @@
+import math
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashers import HASHERS
+
+PASSWORD = 'calibration-Password-123'
+
+# Параметры стоимости -> переменные окружения (core.settings.PASSWORD_HASHER_PARAMS)
+ENV = {
+    'pbkdf2_sha256': {'iterations': 'PBKDF2_ITERATIONS'},
+    'argon2': {'time_cost': 'ARGON2_TIME_COST', 'memory_cost': 'ARGON2_MEMORY_COST',
+               'parallelism': 'ARGON2_PARALLELISM'},
+    'scrypt': {'work_factor': 'SCRYPT_WORK_FACTOR', 'block_size': 'SCRYPT_BLOCK_SIZE'},
+}
+
+
+def build_hasher(algorithm, **params):
+    base = HASHERS[algorithm]
+    if algorithm == 'scrypt':
+        params['maxmem'] = 2 * 128 * params.get('work_factor', base.work_factor) * params.get(
+            'block_size', base.block_size)
+    return type(base.__name__, (base,), params)()
+
+
+def measure(hasher, rounds):
+    """Median seconds per ``encode()``; the first call (imports, caches) is not counted."""
+    hasher.encode(PASSWORD, hasher.salt())
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hasher.encode(PASSWORD, hasher.salt())
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def calibrate(algorithm, target, rounds):
+    """Cost parameters whose hash takes about ``target`` seconds; never below Django's defaults."""
+    base = HASHERS[algorithm].__mro__[1]
+    if algorithm == 'pbkdf2_sha256':
+        probe = 100000
+        seconds = measure(build_hasher(algorithm, iterations=probe), rounds)
+        # Время PBKDF2 линейно по числу итераций
+        iterations = max(int(round(probe * target / seconds, -4)), base.iterations)
+        return {'iterations': iterations}
+    if algorithm == 'scrypt':
+        probe = base.work_factor
+        seconds = measure(build_hasher(algorithm, work_factor=probe), rounds)
+        # N - только степень двойки; время и память растут линейно по N
+        exponent = max(round(math.log2(probe * target / seconds)), int(math.log2(probe)))
+        return {'work_factor': 2 ** exponent, 'block_size': base.block_size}
+    if algorithm == 'argon2':
+        # Память и параллелизм оставляем, подбираем число проходов
+        params = {'memory_cost': base.memory_cost, 'parallelism': base.parallelism}
+        seconds = measure(build_hasher(algorithm, time_cost=base.time_cost, **params), rounds)
+        time_cost = max(round(base.time_cost * target / seconds), base.time_cost)
+        return {'time_cost': time_cost, **params}
+    raise CommandError(f'Unknown hasher {algorithm!r}')
+
+
+def is_available(algorithm):
+    try:
+        HASHERS[algorithm]()._load_library()
+    except (ValueError, AttributeError):
+        # Argon2 без argon2-cffi: ValueError; у PBKDF2/scrypt библиотеки нет
+        return algorithm != 'argon2'
+    return True
+
+
+def update_env_file(path, values):
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    missing = dict(values)
+    for i, line in enumerate(lines):
+        match = re.match(r'\s*([A-Z0-9_]+)\s*=', line)
+        if match and match.group(1) in missing:
+            lines[i] = f'{match.group(1)}={missing.pop(match.group(1))}'
+    lines.extend(f'{key}={value}' for key, value in missing.items())
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the password hashers on this machine and recommends (or writes to an env file) '
+            'cost parameters for a target time per hash. Hashes of users with other parameters are '
+            'upgraded on their next login.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250.0, help='Target time per hash.')
+        parser.add_argument('--hasher', action='append', choices=sorted(HASHERS),
+                            help='Hasher to calibrate (repeatable); all available by default.')
+        parser.add_argument('--prefer', choices=sorted(HASHERS),
+                            help='Algorithm for new hashes (PASSWORD_HASHER); the current one by default.')
+        parser.add_argument('--rounds', type=int, default=5, help='Measurements per hasher.')
+        parser.add_argument('--write', metavar='ENV_FILE', help='Write the parameters to this env file.')
+
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        prefer = options['prefer'] or settings.PASSWORD_HASHER
+        algorithms = options['hasher'] or list(HASHERS)
+        if prefer not in algorithms:
+            algorithms.append(prefer)
+
+        env = {'PASSWORD_HASHER': prefer}
+        self.stdout.write(f"{'hasher':<14} {'ms/hash':>8} {'current ms':>10}  parameters")
+        for algorithm in algorithms:
+            if not is_available(algorithm):
+                if algorithm == prefer:
+                    raise CommandError(f'{algorithm} is not available here (pip install argon2-cffi)')
+                self.stdout.write(f'{algorithm:<14} {"-":>8} {"-":>10}  not installed')
+                continue
+            params = calibrate(algorithm, target, options['rounds'])
+            seconds = measure(build_hasher(algorithm, **params), options['rounds'])
+            current = measure(HASHERS[algorithm](), options['rounds'])
+            self.stdout.write(f'{algorithm:<14} {seconds * 1000:>8.1f} {current * 1000:>10.1f}  '
+                              + ', '.join(f'{name}={value}' for name, value in params.items()))
+            if seconds > target * 1.5:
+                self.stdout.write(self.style.WARNING(
+                    f'  {algorithm}: Django defaults alone take longer than the target on this machine'))
+            for name, value in params.items():
+                env[ENV[algorithm][name]] = value
+            if algorithm == prefer:
+                workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', 0) or 1
+                self.stdout.write(f'  ~{workers / seconds:.0f} logins/s per web worker '
+                                  f'with {workers} hashing process(es)')
+
+        self.stdout.write('')
+        for key, value in env.items():
+            self.stdout.write(f'{key}={value}')
+        if options['write']:
+            update_env_file(options['write'], env)
+            self.stdout.write(self.style.SUCCESS(f"Written to {options['write']}; restart the workers to apply"))
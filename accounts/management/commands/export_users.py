@@ -0,0 +1,50 @@
+import csv
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.bulk import FORMATS, USER_FIELDS, RateMeter, export_value, guess_format
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Streams all users to a CSV or JSONL file that import_users can load back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, '-' for stdout.")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, then csv.')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows fetched per round trip from the server-side cursor.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        chunk_size = options['chunk_size']
+
+        # values_list + iterator(): на PostgreSQL это серверный курсор,
+        # в памяти держится только одна пачка строк
+        rows = User.objects.order_by('pk').values_list(*USER_FIELDS).iterator(chunk_size=chunk_size)
+        stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        meter = RateMeter()
+        try:
+            if fmt == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(USER_FIELDS)
+                write = writer.writerow
+            else:
+                def write(row):
+                    stream.write(json.dumps(dict(zip(USER_FIELDS, row)), ensure_ascii=False) + '\n')
+
+            for row in rows:
+                write([export_value(value) for value in row])
+                meter.add(1)
+                if meter.rows % chunk_size == 0:
+                    self.stderr.write(str(meter))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {meter}'))
@@ -0,0 +1,92 @@
+import os
+import sys
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.bulk import (
+    FORMATS, RateMeter, build_user, copy_batch, guess_format, insert_batch, load_checkpoint, read_records,
+    save_checkpoint, supports_copy,
+)
+from accounts.hashing import HashingPool
+
+
+class Command(BaseCommand):
+    help = 'Bulk-loads users from a CSV or JSONL file (columns: accounts.bulk.USER_FIELDS and raw_password).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, '-' for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, then csv.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--copy', action='store_true',
+                            help='Load batches with PostgreSQL COPY instead of multi-row INSERT.')
+        parser.add_argument('--checkpoint', help='File to store progress in; an existing one resumes the import.')
+        parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes that hash raw_password values.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if options['copy'] and not supports_copy():
+            raise CommandError('--copy needs a PostgreSQL database')
+        if path == '-' and options['checkpoint']:
+            raise CommandError('--checkpoint needs a seekable file')
+
+        try:
+            checkpoint = load_checkpoint(options['checkpoint'], os.path.abspath(path))
+        except ValueError as e:
+            raise CommandError(e)
+        if checkpoint['rows']:
+            self.stderr.write(f"Resuming after {checkpoint['rows']} rows")
+
+        self.options = options
+        self.checkpoint = checkpoint
+        self.meter = RateMeter()
+        self.inserted = 0
+        rejected = 0
+
+        pool = HashingPool(workers=options['hash_workers'], queue_size=options['batch_size'])
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            batch, hashing = [], []
+            for record, offset in read_records(stream, fmt, offset=checkpoint['offset']):
+                try:
+                    user = build_user(record, timezone.now())
+                except ValueError as e:
+                    rejected += 1
+                    self.stderr.write(f'Rejected record: {e}')
+                    continue
+                if not user.password:
+                    hashing.append((user, pool.submit(hashers.make_password, record['raw_password'])))
+                batch.append(user)
+
+                if len(batch) >= options['batch_size']:
+                    self._flush(batch, hashing, offset)
+                    batch, hashing = [], []
+            if batch:
+                self._flush(batch, hashing, offset)
+        finally:
+            pool.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        summary = f'Imported {self.meter}, {rejected} rejected'
+        if options['copy']:
+            summary += f', {self.inserted} new'
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def _flush(self, batch, hashing, offset):
+        for user, future in hashing:
+            user.password = future.result()
+        if self.options['copy']:
+            self.inserted += copy_batch(batch)
+        else:
+            insert_batch(batch)
+
+        self.meter.add(len(batch))
+        self.checkpoint['rows'] += len(batch)
+        self.checkpoint['offset'] = offset
+        if self.options['checkpoint']:
+            save_checkpoint(self.options['checkpoint'], self.checkpoint)
+        self.stderr.write(str(self.meter))
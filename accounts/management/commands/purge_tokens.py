@@ -0,0 +1,39 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from accounts.purge import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ('Incrementally deletes expired outstanding/blacklisted refresh tokens. '
+            'Runs once within --time-budget (for cron) or forever with --loop.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--time-budget', type=float, default=60.0,
+                            help='Seconds one run may spend deleting, 0 for no limit.')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Pause between batches, seconds.')
+        parser.add_argument('--grace', type=int, default=0,
+                            help='Keep tokens for this many seconds after they expire.')
+        parser.add_argument('--loop', action='store_true', help='Repeat runs until interrupted.')
+        parser.add_argument('--interval', type=float, default=300.0,
+                            help='Pause between runs in --loop mode, seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = purge_expired_tokens(
+                batch_size=options['batch_size'],
+                time_budget=options['time_budget'] or None,
+                sleep=options['sleep'],
+                grace=timedelta(seconds=options['grace']),
+            )
+            self.stdout.write(json.dumps(stats.as_dict()))
+
+            if not options['loop']:
+                return
+            # Не успели за бюджет - следующий прогон сразу
+            if stats.finished:
+                time.sleep(options['interval'])
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.revocation import revoke_tokens
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Blacklists all live refresh tokens of the selected users (logout from all devices).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', action='append', default=[], help='User email, can be repeated.')
+        parser.add_argument('--group', action='append', default=[], help='Group name, can be repeated.')
+        parser.add_argument('--all-users', action='store_true', help='Revoke the tokens of every user.')
+        parser.add_argument('--batch-size', type=int, default=0,
+                            help='Revoke in batches of this many tokens and report progress.')
+
+    def handle(self, *args, **options):
+        if options['all_users']:
+            users = User.objects.all()
+        elif options['email'] or options['group']:
+            users = User.objects.none()
+            if options['email']:
+                users = users | User.objects.filter(email__in=options['email'])
+            if options['group']:
+                users = users | User.objects.filter(groups__name__in=options['group'])
+            users = users.values('pk')
+        else:
+            raise CommandError('Select users with --email, --group or --all-users')
+
+        def progress(revoked, total):
+            self.stdout.write(f'{revoked}/{total} tokens revoked')
+
+        revoked = revoke_tokens(users, batch_size=options['batch_size'],
+                                progress=progress if options['batch_size'] else None)
+        self.stdout.write(self.style.SUCCESS(f'Revoked {revoked} tokens'))
@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в чистом интерпретаторе: в этом процессе Django уже загружен
+PROBE = '''
+import json, os, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from core.{module} import application
+app = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+print(json.dumps({{'django.setup()': setup - started, 'core.{module}': app - setup, 'URLconf': urls - app}}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Reports how long a fresh process takes to import and load the application '
+            '(django.setup, WSGI/ASGI handler, URLconf) and the slowest top-level imports.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asgi', action='store_true', help='Load core.asgi instead of core.wsgi.')
+        parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to show.')
+
+    def handle(self, *args, **options):
+        module = 'asgi' if options['asgi'] else 'wsgi'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module)],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = self.parse_importtime(result.stderr)
+
+        self.stdout.write('Phase                    seconds')
+        for name, seconds in phases.items():
+            self.stdout.write(f'{name:<24} {seconds:7.3f}')
+        self.stdout.write(f"{'total':<24} {sum(phases.values()):7.3f}")
+
+        self.stdout.write(f"\nImports: {sum(us for _, us in imports) / 1e6:.3f}s total, slowest top-level:")
+        for name, us in sorted(imports, key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f'{us / 1e6:7.3f}  {name}')
+
+    @staticmethod
+    def parse_importtime(output):
+        """Top-level (not nested) imports with their cumulative time in microseconds."""
+        imports = []
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not name.startswith('  '):
+                imports.append((name.strip(), int(cumulative)))
+        return imports
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-18 09:46
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_case_duplicates(apps, schema_editor):
+    # Уникальный индекс по LOWER(email) не создастся, пока есть дубли.
+    # Сливать аккаунты автоматически нельзя - показываем их и останавливаемся.
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    duplicates = (
+        CustomUser.objects.using(schema_editor.connection.alias)
+        .values(email_lower=Lower('email'))
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .order_by('email_lower')
+    )
+    if not duplicates:
+        return
+
+    lines = []
+    for duplicate in duplicates[:50]:
+        accounts = CustomUser.objects.using(schema_editor.connection.alias).alias(
+            email_lower=Lower('email')
+        ).filter(email_lower=duplicate['email_lower']).order_by('id')
+        lines.append(', '.join(f'#{user.id} {user.email}' for user in accounts))
+    raise RuntimeError(
+        'Users whose emails differ only in case must be merged or renamed before this migration:\n'
+        + '\n'.join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_admin_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='customuser_email_ci_unique', violation_error_code='unique', violation_error_message='User with this Email already exists.'),
+        ),
+    ]
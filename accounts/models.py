@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager, Group, Permission
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
+from . import hashing
+
 phone_validator = RegexValidator(
     regex=r'^\+?1?\d{9,15}$',
     message="Phone must be in the format: '+999999999'. Up to 15 digits are allowed."
@@ -10,15 +13,31 @@ phone_validator = RegexValidator(
 
 
 class CustomUserManager(BaseUserManager):
-    def create_user(self, email, password=None, **extra_fields):
+    def build_user(self, email, password=None, **extra_fields):
+        # Несохранённый пользователь с уже посчитанным хешем пароля,
+        # чтобы хеширование не шло внутри транзакции
         if not email:
             raise ValueError('Email is required')
         email = self.normalize_email(email)
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
+        return user
+
+    def create_user(self, email, password=None, **extra_fields):
+        user = self.build_user(email, password, **extra_fields)
         user.save(using=self._db)
         return user
 
+    def get_by_email(self, email):
+        # Фильтр по LOWER("email") попадает в уникальный индекс customuser_email_ci_unique
+        return self.alias(email_lower=Lower('email')).get(email_lower=email.lower())
+
+    async def aget_by_email(self, email):
+        return await self.alias(email_lower=Lower('email')).aget(email_lower=email.lower())
+
+    def get_by_natural_key(self, username):
+        return self.get_by_email(username)
+
     def create_superuser(self, email, password=None, **extra_fields):
         extra_fields.setdefault('is_staff', True)
         extra_fields.setdefault('is_superuser', True)
@@ -40,6 +59,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True, verbose_name='Active')
     is_staff = models.BooleanField(default=False, verbose_name='Staff')
     date_joined = models.DateTimeField(auto_now_add=True, verbose_name='Date of registration')
+    # Растёт при каждом сохранении; ETag профиля в /api/auth/me/
+    version = models.PositiveIntegerField(default=1, editable=False, verbose_name='Version')
+    # last_login и last_seen пишутся пачками из accounts.activity
+    last_seen = models.DateTimeField(blank=True, null=True, editable=False, verbose_name='Last seen')
 
     groups = models.ManyToManyField(
         Group,
@@ -66,6 +89,70 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+    # Хеширование и проверка пароля идут через пул процессов (accounts.hashing),
+    # это покрывает create_user, смену пароля, админку и ModelBackend
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = hashing.verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            # Другой алгоритм или стоимость: пересчёт в фоне, не в запросе
+            hashing.rehasher.schedule(self, raw_password)
+        return is_correct
+
+    # Async-варианты для accounts.async_views: event loop ждёт пул, не блокируясь
+    async def aset_password(self, raw_password):
+        self.password = await hashing.amake_password(raw_password)
+        self._password = raw_password
+
+    async def acheck_password(self, raw_password):
+        is_correct, must_update = await hashing.averify_password(raw_password, self.password)
+        if is_correct and must_update:
+            hashing.rehasher.schedule(self, raw_password)
+        return is_correct
+
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        constraints = [
+            # Email уникален без учёта регистра: User@Mail.com и user@mail.com - один аккаунт
+            models.UniqueConstraint(
+                Lower('email'),
+                name='customuser_email_ci_unique',
+                violation_error_message='User with this Email already exists.',
+                violation_error_code='unique',
+            ),
+        ]
+        indexes = [
+            # Фильтры админки is_staff=True / is_active=False выбирают малую долю
+            # пользователей, индексы по email заодно дают сортировку списка
+            models.Index(fields=['email'], name='customuser_staff_email_idx', condition=models.Q(is_staff=True)),
+            models.Index(fields=['email'], name='customuser_inactive_email_idx',
+                         condition=models.Q(is_active=False)),
+        ]
+
+
+class LoginEvent(models.Model):
+    """Append-only login audit trail, written in batches by accounts.activity."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='login_events',
+                             verbose_name='User')
+    created_at = models.DateTimeField(verbose_name='Time')
+    ip_address = models.GenericIPAddressField(blank=True, null=True, verbose_name='IP address')
+    user_agent = models.CharField(max_length=255, blank=True, verbose_name='User agent')
+
+    class Meta:
+        verbose_name = 'Login event'
+        verbose_name_plural = 'Login events'
+        indexes = [models.Index(fields=['user', '-created_at'], name='loginevent_user_created_idx')]
+
+    def __str__(self):
+        return f'{self.user_id} at {self.created_at:%Y-%m-%d %H:%M:%S}'
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from core.metrics import registry
+
+from .cache import TTLCache, is_shared
+
+PERMISSION_CACHE = getattr(settings, 'PERMISSION_CACHE', 'default')
+PERMISSION_CACHE_TTL = getattr(settings, 'PERMISSION_CACHE_TTL', 300)
+PERMISSION_CACHE_MAXSIZE = getattr(settings, 'PERMISSION_CACHE_MAXSIZE', 10000)
+PERMISSION_CACHE_LOCAL_TTL = getattr(settings, 'PERMISSION_CACHE_LOCAL_TTL', 5)
+
+VERSION_KEY = 'accounts:permissions:version'
+
+# Ключ набора всех прав (суперпользователь) в кэше групп
+ALL_PERMISSIONS = '*'
+
+
+def _names(rows):
+    return frozenset(f'{app_label}.{codename}' for app_label, codename in rows)
+
+
+class PermissionCache:
+    """Permission sets per user and per group, shared by the requests of a worker.
+
+    A user entry holds the user's direct permissions and group ids; group
+    permissions are cached per group, so users of the same groups share them.
+    Any change (see accounts.signals) bumps a version counter in the shared
+    cache ``PERMISSION_CACHE``. A worker that sees a new version drops its
+    entries. A local-memory cache does not reach the other workers, so
+    entries then live only ``local_ttl`` seconds.
+    """
+
+    def __init__(self, cache_alias=PERMISSION_CACHE, ttl=PERMISSION_CACHE_TTL, maxsize=PERMISSION_CACHE_MAXSIZE,
+                 local_ttl=PERMISSION_CACHE_LOCAL_TTL):
+        self.cache_alias = cache_alias
+        self.local_ttl = local_ttl
+        self.users = TTLCache(maxsize, ttl)
+        self.groups = TTLCache(maxsize, ttl)
+        self._version = None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _sync(self):
+        version = self.cache.get(VERSION_KEY)
+        if version != self._version:
+            self.users.clear()
+            self.groups.clear()
+            self._version = version
+
+    def _entry_ttl(self):
+        # Без общего кэша отзыв права в другом воркере виден только по истечении записи
+        return None if is_shared(self.cache) else self.local_ttl
+
+    def user_permissions(self, user_id):
+        return self._user(user_id)[0]
+
+    def group_permissions(self, user_id):
+        group_ids = self._user(user_id)[1]
+        if not group_ids:
+            return frozenset()
+        perms = {}
+        generation = self.groups.generation
+        for group_id in group_ids:
+            cached = self.groups.get(group_id)
+            if cached is not None:
+                perms[group_id] = cached
+        missing = [group_id for group_id in group_ids if group_id not in perms]
+        if missing:
+            loaded = {group_id: set() for group_id in missing}
+            rows = Permission.objects.using(DEFAULT_DB_ALIAS).filter(group__in=missing).values_list(
+                'group__pk', 'content_type__app_label', 'codename').order_by()
+            for group_id, app_label, codename in rows:
+                loaded[group_id].add(f'{app_label}.{codename}')
+            for group_id, names in loaded.items():
+                perms[group_id] = frozenset(names)
+                self.groups.set(group_id, perms[group_id], ttl=self._entry_ttl(), generation=generation)
+        return frozenset().union(*perms.values())
+
+    def all_permissions(self):
+        self._sync()
+        perms = self.groups.get(ALL_PERMISSIONS)
+        if perms is None:
+            generation = self.groups.generation
+            perms = _names(Permission.objects.using(DEFAULT_DB_ALIAS).values_list(
+                'content_type__app_label', 'codename').order_by())
+            self.groups.set(ALL_PERMISSIONS, perms, ttl=self._entry_ttl(), generation=generation)
+        return perms
+
+    def _user(self, user_id):
+        self._sync()
+        entry = self.users.get(user_id)
+        if entry is None:
+            generation = self.users.generation
+            # С primary: после изменения прав реплика вернула бы старые, и они
+            # остались бы в кэше до конца TTL
+            perms = _names(Permission.objects.using(DEFAULT_DB_ALIAS).filter(user=user_id).values_list(
+                'content_type__app_label', 'codename').order_by())
+            group_ids = tuple(Group.objects.using(DEFAULT_DB_ALIAS).filter(user=user_id).values_list(
+                'pk', flat=True).order_by())
+            entry = (perms, group_ids)
+            self.users.set(user_id, entry, ttl=self._entry_ttl(), generation=generation)
+        return entry
+
+    def invalidate(self):
+        """Drops every cached permission set, in this worker and (through the version) in the others."""
+        self.users.clear()
+        self.groups.clear()
+        cache = self.cache
+        cache.add(VERSION_KEY, 0, timeout=None)
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            # Ключ вытеснен между add и incr
+            cache.set(VERSION_KEY, 1, timeout=None)
+
+    def stats(self):
+        return {'users': self.users.stats(), 'groups': self.groups.stats()}
+
+
+permission_cache = PermissionCache()
+
+
+@registry.collector
+def permission_cache_metrics():
+    for name, stats in permission_cache.stats().items():
+        yield 'permission_cache_hits_total', (('cache', name),), stats['hits']
+        yield 'permission_cache_misses_total', (('cache', name),), stats['misses']
@@ -0,0 +1,75 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PurgeStats:
+    outstanding_deleted: int = 0
+    blacklisted_deleted: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    finished: bool = False
+    # Насколько отстаём: возраст самого старого просроченного токена, который остался
+    lag: timedelta = field(default_factory=timedelta)
+
+    def as_dict(self):
+        return {
+            'outstanding_deleted': self.outstanding_deleted,
+            'blacklisted_deleted': self.blacklisted_deleted,
+            'batches': self.batches,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'finished': self.finished,
+            'lag_seconds': int(self.lag.total_seconds()),
+        }
+
+
+def purge_expired_tokens(batch_size=1000, time_budget=None, sleep=0.0, grace=timedelta(0)):
+    """Deletes expired OutstandingToken rows and their blacklist entries in small batches.
+
+    Batches are selected by keyset pagination over the primary key and each
+    one is deleted in its own short transaction, so the tables are never
+    locked for long. Stops when nothing is left or when ``time_budget``
+    seconds have been spent, sleeping ``sleep`` seconds between batches.
+    """
+    started = time.monotonic()
+    cutoff = timezone.now() - grace
+    expired = OutstandingToken.objects.filter(expires_at__lt=cutoff).order_by('pk')
+    stats = PurgeStats()
+    last_pk = 0
+
+    while True:
+        ids = list(expired.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            stats.finished = True
+            break
+
+        with transaction.atomic():
+            _, deleted = OutstandingToken.objects.filter(pk__in=ids).delete()
+        stats.outstanding_deleted += deleted.get(OutstandingToken._meta.label, 0)
+        stats.blacklisted_deleted += deleted.get('token_blacklist.BlacklistedToken', 0)
+        stats.batches += 1
+        last_pk = ids[-1]
+
+        if len(ids) < batch_size:
+            stats.finished = True
+            break
+        if time_budget is not None and time.monotonic() - started + sleep >= time_budget:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    stats.elapsed = time.monotonic() - started
+    oldest = None if stats.finished else expired.aggregate(oldest=Min('expires_at'))['oldest']
+    stats.lag = cutoff - oldest if oldest else timedelta(0)
+
+    logger.info('Purged expired tokens: %s', stats.as_dict())
+    return stats
@@ -0,0 +1,130 @@
+import logging
+import threading
+
+from django.db import connections, router
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+from .blacklist import blacklist_index
+
+logger = logging.getLogger(__name__)
+
+
+def pending_tokens(users, now=None):
+    """Outstanding, not yet expired and not yet blacklisted tokens of ``users``.
+
+    ``users`` is anything accepted by ``user__in``: a queryset, a list of
+    instances or a list of primary keys.
+    """
+    now = now or timezone.now()
+    return OutstandingToken.objects.filter(
+        user__in=users,
+        expires_at__gt=now,
+        blacklistedtoken__isnull=True,
+    )
+
+
+def _blacklist_queryset(tokens, now):
+    """Copies the ids of ``tokens`` into the blacklist with a single INSERT ... SELECT.
+
+    Rows that were blacklisted concurrently are skipped by the unique
+    constraint on ``token_id`` instead of failing the whole statement.
+    """
+    using = router.db_for_write(BlacklistedToken)
+    connection = connections[using]
+    ops = connection.ops
+
+    select_sql, select_params = tokens.order_by().values_list('pk').query.get_compiler(using=using).as_sql()
+    blacklisted_at = BlacklistedToken._meta.get_field('blacklisted_at').get_db_prep_value(now, connection)
+    sql = '{insert} {table} ({token_id}, {blacklisted_at}) SELECT pending.id, %s FROM ({select}) AS pending {suffix}'.format(
+        insert=ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        table=ops.quote_name(BlacklistedToken._meta.db_table),
+        token_id=ops.quote_name('token_id'),
+        blacklisted_at=ops.quote_name('blacklisted_at'),
+        select=select_sql,
+        suffix=ops.on_conflict_suffix_sql(None, OnConflict.IGNORE, None, None),
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (blacklisted_at, *select_params))
+        revoked = max(cursor.rowcount, 0)
+
+    if revoked:
+        blacklist_index.notify()
+    return revoked
+
+
+def revoke_tokens(users, batch_size=None, progress=None):
+    """Blacklists every live refresh token of ``users`` and returns how many were revoked.
+
+    Without ``batch_size`` this is one statement regardless of how many
+    tokens the users hold. With ``batch_size`` the tokens are walked in
+    primary key order, one short statement per batch, and ``progress`` is
+    called as ``progress(revoked, total)`` after each of them.
+    """
+    now = timezone.now()
+    tokens = pending_tokens(users, now)
+
+    if not batch_size:
+        revoked = _blacklist_queryset(tokens, now)
+        if progress:
+            progress(revoked, revoked)
+        return revoked
+
+    total = tokens.count()
+    revoked = 0
+    last_pk = 0
+    while True:
+        upper = list(
+            tokens.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size]
+        )
+        if upper:
+            batch = tokens.filter(pk__gt=last_pk, pk__lte=upper[0])
+        else:
+            batch = tokens.filter(pk__gt=last_pk)
+
+        revoked += _blacklist_queryset(batch, now)
+        if progress:
+            progress(revoked, total)
+        if not upper:
+            return revoked
+        last_pk = upper[0]
+
+
+class RevocationJob(threading.Thread):
+    """Runs :func:`revoke_tokens` in batches on a background thread.
+
+    ``revoked``/``total`` can be read while the job is running, e.g. by the
+    admin or a management command reporting progress.
+    """
+
+    def __init__(self, users, batch_size=1000, progress=None):
+        super().__init__(name='token-revocation', daemon=True)
+        self.users = users
+        self.batch_size = batch_size
+        self.callback = progress
+        self.revoked = 0
+        self.total = None
+        self.error = None
+
+    def _progress(self, revoked, total):
+        self.revoked, self.total = revoked, total
+        logger.info('Token revocation progress: %s/%s', revoked, total)
+        if self.callback:
+            self.callback(revoked, total)
+
+    def run(self):
+        try:
+            revoke_tokens(self.users, batch_size=self.batch_size, progress=self._progress)
+        except Exception as e:
+            self.error = e
+            logger.exception('Token revocation failed')
+        finally:
+            connections.close_all()
+
+
+def start_revocation(users, batch_size=1000, progress=None):
+    job = RevocationJob(users, batch_size=batch_size, progress=progress)
+    job.start()
+    return job
@@ -1,11 +1,34 @@
+from asgiref.sync import sync_to_async
 from rest_framework import serializers
+from rest_framework.serializers import as_serializer_error
 from django.contrib.auth import get_user_model, authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.utils.field_mapping import get_unique_error_message
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
+
+from .activity import tracker
+from .backends import aauthenticate
+from .blacklist import blacklist_index
+from .throttling import login_throttle
+from .tokens import RefreshToken
 
 User = get_user_model()
 
 
+def is_email_conflict(exc):
+    """Whether an IntegrityError is the unique email violation and not some other constraint."""
+    diag = getattr(exc.__cause__, 'diag', None)
+    constraint = getattr(diag, 'constraint_name', None)
+    if constraint:
+        # PostgreSQL: customuser_email_ci_unique или уникальность самой колонки email
+        return 'email' in constraint
+    message = str(exc)
+    return 'customuser_email_ci_unique' in message or f'{User._meta.db_table}.email' in message
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
     password2 = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
@@ -15,6 +38,8 @@ class RegisterSerializer(serializers.ModelSerializer):
         # fields = ['email', 'first_name', 'last_name', 'phone', 'address', 'password', 'password2']
         fields = ['email', 'password', 'password2']
         extra_kwargs = {
+            # Уникальность email проверяет constraint в БД при вставке (см. create)
+            'email': {'validators': []},
             'password': {'write_only': True},
             'password2': {'write_only': True},
         }
@@ -23,14 +48,35 @@ class RegisterSerializer(serializers.ModelSerializer):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password": "The passwords do not match"})
 
-        if User.objects.filter(email=attrs['email']).exists():
-            raise serializers.ValidationError({"email": "User with this email already exists"})
-
         return attrs
 
     def create(self, validated_data):
         validated_data.pop('password2')
-        user = User.objects.create_user(**validated_data)
+        user = User.objects.build_user(**validated_data)
+        return self.save_user(user)
+
+    async def acreate(self):
+        """create() for async views: the password is hashed without blocking the event loop."""
+        validated_data = dict(self.validated_data)
+        validated_data.pop('password2')
+        password = validated_data.pop('password')
+        user = User.objects.build_user(**validated_data)
+        await user.aset_password(password)
+        # transaction.atomic() не работает в async-коде
+        return await sync_to_async(self.save_user)(user)
+
+    def save_user(self, user):
+        # Пользователь и его refresh-токен создаются в одной транзакции
+        try:
+            with transaction.atomic():
+                user.save()
+                self.refresh = RefreshToken.for_user(user)
+        except IntegrityError as exc:
+            if not is_email_conflict(exc):
+                raise
+            # То же сообщение, что давал UniqueValidator
+            message = get_unique_error_message(User._meta.get_field('email'))
+            raise serializers.ValidationError({'email': [message]}, code='unique')
         return user
 
 
@@ -43,7 +89,18 @@ class LoginSerializer(serializers.Serializer):
             username=attrs['email'],
             password=attrs['password']
         )
+        return self.check_user(user)
+
+    async def avalidate(self, data):
+        """Validation for async views, with the same errors as is_valid()."""
+        attrs = self.to_internal_value(data)
+        user = await aauthenticate(username=attrs['email'], password=attrs['password'])
+        try:
+            return self.check_user(user)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError(as_serializer_error(exc))
 
+    def check_user(self, user):
         if not user:
             raise serializers.ValidationError({"message": "Invalid email or password"})
 
@@ -66,6 +123,14 @@ class LogoutSerializer(serializers.Serializer):
         except Exception as e:
             raise serializers.ValidationError({'error': 'Invalid token'})
 
+    async def asave(self):
+        try:
+            # Проверка по индексу чёрного списка может обратиться к БД
+            token = await sync_to_async(RefreshToken)(self.token)
+            await token.ablacklist()
+        except Exception:
+            raise serializers.ValidationError({'error': 'Invalid token'})
+
 
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True)
@@ -73,4 +138,30 @@ class ChangePasswordSerializer(serializers.Serializer):
 
     def validate_new_password(self, value):
         validate_password(value)
-        return value
\ No newline at end of file
+        return value
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Вместо UPDATE_LAST_LOGIN: last_login пишется пачкой в фоне
+        tracker.login(self.user, self.context.get('request'))
+        login_throttle.succeeded(self.user.email)
+        return data
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+
+        # Та же проверка, что и в simplejwt, но через индекс без запроса в БД
+        if api_settings.BLACKLIST_AFTER_ROTATION and token.get(api_settings.JTI_CLAIM) in blacklist_index:
+            raise serializers.ValidationError('Token is blacklisted')
+
+        return {}
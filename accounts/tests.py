@@ -1,3 +1,1033 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.models import Group, Permission
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, OperationalError, connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from drf_spectacular.generators import SchemaGenerator
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+from core import routers
+from core.middleware import FastLaneMiddleware, ReplicaRoutingMiddleware
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+from core.routers import ReplicaMonitor, ReplicaRouter
+from core.schema import SchemaCache
+
+from . import benchmark
+from .activity import ActivityTracker, tracker
+from .authentication import token_cache, user_cache
+from .blacklist import blacklist_index
+from .health import ReadinessProbe
+from .models import LoginEvent
+from .permission_cache import permission_cache
+from .hashers import PBKDF2PasswordHasher, _param
+from .hashing import HashingPool, HashingPoolBusy, fail_fast, pool, rehasher
+from .purge import purge_expired_tokens
+from .revocation import revoke_tokens
+from .throttling import LocalStore, SlidingWindowLimiter, client_ident, login_throttle
+from .tokens import RefreshToken
+
+User = get_user_model()
+
+
+class RevokeTokensTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+        self.other = User.objects.create_user(email='other@example.com', password='Secret-pass-123')
+        self.tokens = [RefreshToken.for_user(self.user) for _ in range(5)]
+        self.other_token = RefreshToken.for_user(self.other)
+
+    def test_revokes_only_live_tokens_of_selected_users(self):
+        expired = OutstandingToken.objects.filter(user=self.user).order_by('pk').first()
+        expired.expires_at = timezone.now() - timedelta(days=1)
+        expired.save()
+        self.tokens[1].blacklist()
+
+        with self.assertNumQueries(1):
+            revoked = revoke_tokens([self.user.pk])
+
+        self.assertEqual(revoked, 3)
+        self.assertEqual(BlacklistedToken.objects.filter(token__user=self.user).count(), 4)
+        self.assertFalse(BlacklistedToken.objects.filter(token__user=self.other).exists())
+        self.assertEqual(revoke_tokens([self.user.pk]), 0)
+
+    def test_batches_report_progress(self):
+        progress = []
+        revoked = revoke_tokens(User.objects.all(), batch_size=2, progress=lambda *args: progress.append(args))
+
+        self.assertEqual(revoked, 6)
+        self.assertEqual(progress, [(2, 6), (4, 6), (6, 6), (6, 6)])
+
+    def test_logout_all_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post(reverse('auth_logout_all'))
+
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(BlacklistedToken.objects.filter(token__user=self.user).count(), 5)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_cache_hit_skips_user_query(self):
+        self.client.post(reverse('auth_logout_all'))
+        hits = user_cache.hits
+
+        with self.assertNumQueries(1):  # только INSERT в blacklist
+            response = self.client.post(reverse('auth_logout_all'))
+
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(user_cache.hits, hits + 1)
+
+    def test_deactivated_user_is_rejected_after_save(self):
+        self.client.post(reverse('auth_logout_all'))
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.post(reverse('auth_logout_all'))
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_keeps_columns_changed_behind_cache(self):
+        self.client.get(reverse('auth_me'))
+        # Запись из другого воркера: кэш этого воркера о ней не знает
+        User.objects.filter(pk=self.user.pk).update(is_staff=True, first_name='Changed', version=7)
+
+        response = self.client.post(reverse('auth_password_change'), {
+            'old_password': 'Secret-pass-123', 'new_password': 'New-secret-pass-456'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual((user.is_staff, user.first_name, user.version), (True, 'Changed', 8))
+        self.assertTrue(user.check_password('New-secret-pass-456'))
+
+
+class BlacklistIndexTests(TestCase):
+    def setUp(self):
+        blacklist_index.reset()
+        self.user = User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def test_refresh_does_not_query_blacklist(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            self.assertTrue(blacklist_index.shared)
+            self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)})
+
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_local_cache_checks_misses_in_database(self):
+        self.assertFalse(blacklist_index.shared)
+        self.assertNotIn(self.refresh['jti'], blacklist_index)
+
+        # Запись другого воркера: версия в его локальном кэше, этот о ней не знает
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=self.refresh['jti']))
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_is_visible_to_index(self):
+        self.assertNotIn(self.refresh['jti'], blacklist_index)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        client.post(reverse('auth_logout'), {'refresh': str(self.refresh)})
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_all_is_visible_to_index(self):
+        self.assertNotIn(self.refresh['jti'], blacklist_index)
+
+        revoke_tokens([self.user.pk])
+
+        self.assertIn(self.refresh['jti'], blacklist_index)
+
+
+class HashingPoolTests(TestCase):
+    def test_password_is_hashed_in_pool(self):
+        user = User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('Secret-pass-123'))
+        self.assertFalse(user.check_password('wrong'))
+
+    def test_full_queue_fails_fast(self):
+        busy_pool = HashingPool(workers=1, queue_size=0)
+        try:
+            busy_pool.submit(time.sleep, 0.5)
+            with fail_fast(), self.assertRaises(HashingPoolBusy):
+                busy_pool.submit(time.sleep, 0)
+            # Вне API ждать некому обработать 503 - считаем в вызывающем потоке
+            self.assertEqual(busy_pool.submit(abs, -1).result(), 1)
+        finally:
+            busy_pool.shutdown()
+
+    def test_full_pool_answers_503_only_in_api(self):
+        User.objects.create_superuser(email='admin@example.com', password='Secret-pass-123')
+        full = mock.Mock(**{'acquire.return_value': False})
+
+        with mock.patch.object(pool, '_slots', full):
+            response = self.client.post(reverse('admin:login'),
+                                        {'username': 'admin@example.com', 'password': 'Secret-pass-123'})
+            self.assertEqual(response.status_code, 302)
+
+            response = self.client.post(reverse('auth_login'),
+                                        {'email': 'admin@example.com', 'password': 'Secret-pass-123'})
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response)
+
+    def test_login_returns_503_with_retry_after(self):
+        User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+
+        with mock.patch.object(pool, 'submit', side_effect=HashingPoolBusy(wait=2)):
+            response = self.client.post(reverse('auth_login'),
+                                        {'email': 'user@example.com', 'password': 'Secret-pass-123'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+
+class ImportExportUsersTests(TestCase):
+    def test_round_trip_keeps_password_hashes(self):
+        User.objects.create_user(email='user@example.com', password='Secret-pass-123', first_name='Anna')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.jsonl')
+            call_command('export_users', path, stderr=io.StringIO())
+            User.objects.all().delete()
+
+            call_command('import_users', path, checkpoint=os.path.join(tmp, 'cp.json'),
+                         stdout=io.StringIO(), stderr=io.StringIO())
+
+            with open(os.path.join(tmp, 'cp.json')) as f:
+                self.assertEqual(json.load(f)['rows'], 1)
+
+        user = User.objects.get()
+        self.assertEqual((user.email, user.first_name), ('user@example.com', 'Anna'))
+        self.assertTrue(user.check_password('Secret-pass-123'))
+
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+    def test_copy_import(self):
+        User.objects.create_user(email='taken@example.com')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'users.csv')
+            with open(path, 'w') as f:
+                f.write('email,raw_password,first_name,is_staff\n'
+                        'copy@example.com,Secret-pass-123,,true\n'
+                        'taken@example.com,Secret-pass-123,Taken,false\n')
+
+            call_command('import_users', path, copy=True, hash_workers=1, stdout=io.StringIO(),
+                         stderr=io.StringIO())
+
+        user = User.objects.get(email='copy@example.com')
+        self.assertEqual((user.first_name, user.is_staff, user.is_superuser, user.version, user.last_login),
+                         (None, True, False, 1, None))
+        self.assertTrue(user.check_password('Secret-pass-123'))
+        self.assertIsNone(User.objects.get(email='taken@example.com').first_name)
+
+class RegisterTests(TestCase):
+    data = {'email': 'new@example.com', 'password': 'Secret-pass-123', 'password2': 'Secret-pass-123'}
+
+    def test_register_query_count(self):
+        # SAVEPOINT, INSERT пользователя, INSERT OutstandingToken, RELEASE SAVEPOINT
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('auth_register'), self.data)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(OutstandingToken.objects.filter(user__email='new@example.com').exists())
+
+    def test_duplicate_email_returns_400(self):
+        User.objects.create_user(email='new@example.com', password='Secret-pass-123')
+
+        response = self.client.post(reverse('auth_register'), self.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['User with this Email already exists.']})
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_other_integrity_errors_are_not_reported_as_duplicate_email(self):
+        error = IntegrityError('UNIQUE constraint failed: token_blacklist_outstandingtoken.jti')
+        with mock.patch('accounts.serializers.RefreshToken.for_user', side_effect=error), \
+                self.assertRaises(IntegrityError):
+            self.client.post(reverse('auth_register'), self.data)
+
+        self.assertFalse(User.objects.exists())
+
+
+class PurgeExpiredTokensTests(TestCase):
+    def test_deletes_expired_tokens_in_batches(self):
+        user = User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+        for _ in range(5):
+            RefreshToken.for_user(user).blacklist()
+        live = RefreshToken.for_user(user)
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+
+        stats = purge_expired_tokens(batch_size=2)
+
+        self.assertTrue(stats.finished)
+        self.assertEqual((stats.outstanding_deleted, stats.blacklisted_deleted, stats.batches), (5, 5, 3))
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+
+    def test_time_budget_stops_early_and_reports_lag(self):
+        user = User.objects.create_user(email='user@example.com', password='Secret-pass-123')
+        for _ in range(3):
+            RefreshToken.for_user(user)
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(hours=1))
+
+        stats = purge_expired_tokens(batch_size=1, time_budget=0)
+
+        self.assertFalse(stats.finished)
+        self.assertEqual(stats.outstanding_deleted, 1)
+        self.assertGreaterEqual(stats.lag, timedelta(minutes=59))
+
+
+# Без DEBUG статика берётся из манифеста collectstatic, которого в тестах нет
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CustomUserAdminTests(TestCase):
+    def test_changelist_search_and_filters(self):
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='Secret-pass-123')
+        User.objects.create_user(email='anna@example.com', password='Secret-pass-123', is_active=False)
+        self.client.force_login(admin_user)
+
+        response = self.client.get(reverse('admin:accounts_customuser_changelist'),
+                                   {'q': 'ann', 'is_active__exact': '0'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PermissionCacheTests(TestCase):
+    def setUp(self):
+        permission_cache.invalidate()
+        self.user = User.objects.create_user(email='staff@example.com', password='Secret-pass-123', is_staff=True)
+        self.group = Group.objects.create(name='Managers')
+        self.view_perm = Permission.objects.get(codename='view_customuser')
+        self.change_perm = Permission.objects.get(codename='change_customuser')
+        self.group.permissions.add(self.view_perm)
+        self.user.groups.add(self.group)
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permissions_are_shared_between_instances(self):
+        self.assertTrue(self.fresh_user().has_perm('accounts.view_customuser'))
+        user = self.fresh_user()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('accounts.view_customuser'))
+            self.assertFalse(user.has_perm('accounts.change_customuser'))
+
+    def test_local_cache_entries_expire_quickly(self):
+        self.assertTrue(self.fresh_user().has_perm('accounts.view_customuser'))
+        later = time.monotonic() + permission_cache.local_ttl + 1
+
+        with mock.patch('accounts.cache.time.monotonic', return_value=later), \
+                CaptureQueriesContext(connections['default']) as queries:
+            self.fresh_user().has_perm('accounts.view_customuser')
+        # Пользователь, его права и группы, права группы
+        self.assertEqual(len(queries), 4)
+
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            self.assertTrue(self.fresh_user().has_perm('accounts.view_customuser'))
+            user = self.fresh_user()
+            with mock.patch('accounts.cache.time.monotonic', return_value=later), self.assertNumQueries(0):
+                self.assertTrue(user.has_perm('accounts.view_customuser'))
+
+    def test_group_permission_change_invalidates(self):
+        self.assertFalse(self.fresh_user().has_perm('accounts.change_customuser'))
+        self.group.permissions.add(self.change_perm)
+
+        self.assertTrue(self.fresh_user().has_perm('accounts.change_customuser'))
+
+    def test_membership_change_invalidates(self):
+        self.assertTrue(self.fresh_user().has_perm('accounts.view_customuser'))
+        self.group.customuser_set.remove(self.user)
+
+        self.assertFalse(self.fresh_user().has_perm('accounts.view_customuser'))
+
+    def test_direct_permission_change_invalidates(self):
+        self.assertEqual(self.fresh_user().get_user_permissions(), set())
+        self.user.user_permissions.add(self.change_perm)
+
+        self.assertEqual(self.fresh_user().get_user_permissions(), {'accounts.change_customuser'})
+
+    def test_group_delete_invalidates(self):
+        self.assertTrue(self.fresh_user().has_perm('accounts.view_customuser'))
+        self.group.delete()
+
+        self.assertFalse(self.fresh_user().has_perm('accounts.view_customuser'))
+
+    def test_admin_permission_widget_does_not_query_per_permission(self):
+        # Выбор прав в filter_horizontal: UserChangeForm делает select_related('content_type')
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='Secret-pass-123')
+        self.client.force_login(admin_user)
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse('admin:accounts_customuser_change', args=[self.user.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        content_type_queries = [q for q in queries if q['sql'].startswith('SELECT') and
+                                'FROM "django_content_type"' in q['sql']]
+        self.assertLessEqual(len(content_type_queries), 1)
+
+
+class CaseInsensitiveEmailTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(email='Anna@Example.com', password='Secret-pass-123')
+
+    def test_login_ignores_email_case(self):
+        response = self.client.post(reverse('auth_login'),
+                                    {'email': 'anna@EXAMPLE.com', 'password': 'Secret-pass-123'})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_register_rejects_email_differing_only_in_case(self):
+        response = self.client.post(reverse('auth_register'), {
+            'email': 'ANNA@example.com', 'password': 'Secret-pass-123', 'password2': 'Secret-pass-123',
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['User with this Email already exists.']})
+
+
+class HealthCheckTests(TestCase):
+    def test_liveness_does_not_touch_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('health_live'))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_readiness_result_is_cached(self):
+        probe = ReadinessProbe(ttl=60)
+
+        result = probe.check()
+        with self.assertNumQueries(0):
+            cached = probe.check()
+
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['migrations'], {'pending': 0})
+        self.assertEqual(cached['db'], result['db'])
+        self.assertEqual(len(probe.latencies), 1)
+
+    def test_readiness_hides_database_errors(self):
+        probe = ReadinessProbe(ttl=0)
+
+        with mock.patch('django.db.backends.utils.CursorWrapper.execute', side_effect=DatabaseError('secret')), \
+                self.assertLogs('accounts.health', 'ERROR'):
+            result = probe.check()
+
+        self.assertEqual(result, {'status': 'error', 'db': mock.ANY, 'cached_for': 0.0})
+        self.assertEqual(result['db']['status'], 'down')
+        self.assertNotIn('secret', str(result))
+
+    def test_readiness_view_reports_connection_stats(self):
+        response = self.client.get(reverse('health_ready'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('reused', response.json()['connections'])
+
+
+class MetricsTests(TestCase):
+    def test_server_timing_counts_queries(self):
+        User.objects.create_user(email='metrics@example.com', password='pass12345')
+
+        response = self.client.post(reverse('auth_login'), {'email': 'metrics@example.com', 'password': 'pass12345'})
+
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('hash;dur=', timing)
+        self.assertIn('jwt;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('health_ready'))
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{view="health_ready",method="GET",status="200",le="+Inf"}',
+                      body)
+        self.assertIn('db_queries_total{view="health_ready"}', body)
+        self.assertIn('# TYPE auth_cache_hits_total counter', body)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_metrics_endpoint_refuses_external_clients(self):
+        external = Client(REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='127.0.0.1')
+
+        self.assertEqual(external.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(external.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(external.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+
+
+class AsyncViewsTests(TestCase):
+    async def test_register_login_logout(self):
+        response = await self.async_client.post(
+            reverse('async_auth_register'),
+            {'email': 'async@example.com', 'password': 'pass12345', 'password2': 'pass12345'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user']['email'], 'async@example.com')
+
+        response = await self.async_client.post(
+            reverse('async_auth_login'), {'email': 'ASYNC@example.com', 'password': 'pass12345'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        tokens = response.json()
+        self.assertEqual(await OutstandingToken.objects.acount(), 2)
+
+        response = await self.async_client.post(
+            reverse('async_auth_logout'), {'refresh': tokens['refresh']}, content_type='application/json',
+            headers={'Authorization': f"Bearer {tokens['access']}"},
+        )
+        self.assertEqual(response.status_code, 205)
+        self.assertTrue(await BlacklistedToken.objects.filter(token__token=tokens['refresh']).aexists())
+
+    async def test_errors_match_sync_views(self):
+        await User.objects.acreate(email='taken@example.com')
+
+        response = await self.async_client.post(
+            reverse('async_auth_register'),
+            {'email': 'Taken@example.com', 'password': 'pass12345', 'password2': 'pass12345'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['User with this Email already exists.']})
+
+        response = await self.async_client.post(
+            reverse('async_auth_login'), {'email': 'taken@example.com', 'password': 'wrong'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': ['Invalid email or password']})
+
+        response = await self.async_client.post(reverse('async_auth_logout_all'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response.headers)
+
+
+class FastLaneMiddlewareTests(TestCase):
+    def setUp(self):
+        self.seen = {}
+
+        def get_response(request):
+            self.seen[request.path] = hasattr(request, 'session'), hasattr(request, 'user')
+            return HttpResponse()
+
+        self.middleware = FastLaneMiddleware(get_response)
+
+    def test_api_skips_full_stack(self):
+        factory = RequestFactory()
+        for path in ('/api/auth/login/', '/admin/', '/api/docs/'):
+            self.middleware(factory.get(path))
+
+        self.assertEqual(self.seen['/api/auth/login/'], (False, False))
+        self.assertEqual(self.seen['/admin/'], (True, True))
+        self.assertEqual(self.seen['/api/docs/'], (True, True))
+
+    def test_admin_keeps_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+
+        response = client.post(reverse('admin:login'), {'username': 'a@example.com', 'password': 'x'})
+
+        self.assertEqual(response.status_code, 403)
+
+
+class SchemaViewTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        patcher = mock.patch('core.schema.schema_cache', SchemaCache(self.cache_dir))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_schema_is_generated_once(self):
+        with mock.patch('core.schema.SchemaGenerator.get_schema', autospec=True,
+                        side_effect=SchemaGenerator.get_schema) as get_schema:
+            first = self.client.get(reverse('schema'), HTTP_ACCEPT='application/json')
+            second = self.client.get(reverse('schema'), HTTP_ACCEPT='application/json')
+
+        self.assertEqual(get_schema.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('/api/auth/login/', first.json()['paths'])
+        self.assertTrue(os.path.exists(self.cache.path('json')))
+
+    def test_etag_and_gzip(self):
+        response = self.client.get(reverse('schema'))
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi; charset=utf-8')
+
+        not_modified = self.client.get(reverse('schema'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        gzipped = self.client.get(reverse('schema'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzipped.content), response.content)
+
+    def test_prebuilt_file_is_used(self):
+        self.cache.build()
+        fresh = SchemaCache(self.cache_dir)
+
+        with mock.patch('core.schema.SchemaGenerator.get_schema') as get_schema:
+            fresh.get('yaml')
+
+        get_schema.assert_not_called()
+
+
+class ORJSONTests(TestCase):
+    def test_renderer_matches_drf(self):
+        data = {
+            'created': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'day': datetime(2024, 5, 1).date(),
+            'price': Decimal('10.50'),
+            'message': gettext_lazy('This field is required.'),
+            'errors': [ErrorDetail('Invalid', code='invalid')],
+            'tags': {'a'},
+            'text': 'line\u2028separator Юникод',
+            1: None,
+        }
+
+        for media_type in (None, 'application/json; indent=2', 'application/json; indent=4'):
+            with self.subTest(media_type=media_type):
+                self.assertEqual(ORJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_parser_matches_drf(self):
+        body = '{"email": "anna@example.com", "n": 123456789012345678901234567890, "t": "Юникод"}'.encode()
+
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for invalid in (b'{"a": NaN}', b'{"a": '):
+            with self.assertRaises(ParseError) as expected:
+                JSONParser().parse(io.BytesIO(invalid))
+            with self.assertRaisesMessage(ParseError, str(expected.exception.detail)):
+                ORJSONParser().parse(io.BytesIO(invalid))
+
+
+class MeViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='me@example.com', password='Secret-pass-123', first_name='Anna')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_fields_selects_subset(self):
+        response = self.client.get(reverse('auth_me'), {'fields': 'email,first_name'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'email': 'me@example.com', 'first_name': 'Anna'})
+        self.assertEqual(response['ETag'], f'"{self.user.pk}-1"')
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('auth_me'), {'fields': 'email,password'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(reverse('auth_me'))['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('auth_me'), HTTP_IF_NONE_MATCH=f'W/{etag}')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_changes_on_save(self):
+        etag = self.client.get(reverse('auth_me'))['ETag']
+        self.user.phone = '+123456789'
+        self.user.save(update_fields=['phone'])
+
+        response = self.client.get(reverse('auth_me'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['phone'], '+123456789')
+
+    def test_patch_with_if_match(self):
+        etag = self.client.get(reverse('auth_me'))['ETag']
+
+        response = self.client.patch(reverse('auth_me'), {'last_name': 'Ivanova', 'email': 'x@example.com'},
+                                     format='json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['last_name'], 'Ivanova')
+        self.assertEqual(response.json()['email'], 'me@example.com')
+        self.assertEqual(response['ETag'], f'"{self.user.pk}-2"')
+
+        stale = self.client.patch(reverse('auth_me'), {'last_name': 'Petrova'}, format='json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(stale.status_code, 412)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_name, 'Ivanova')
+
+    def test_patch_validates_input(self):
+        response = self.client.patch(reverse('auth_me'), {'phone': 'not a phone'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.version, 1)
+
+
+class ActivityTrackerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='active@example.com', password='Secret-pass-123')
+        self.other = User.objects.create_user(email='other@example.com', password='Secret-pass-123')
+        self.tracker = ActivityTracker(interval=0)
+
+    def test_flush_coalesces_updates(self):
+        self.tracker.login(self.user)
+        self.tracker.login(self.user)
+        self.tracker.seen(self.other.pk)
+        self.tracker.seen(self.other.pk)
+
+        self.assertEqual(self.tracker.pending(), {'logins': 1, 'seen': 2, 'events': 2})
+        self.assertEqual(self.tracker.flush(), 2)
+
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertIsNotNone(self.other.last_seen)
+        self.assertIsNone(self.other.last_login)
+        # queryset.update(): ETag профиля не меняется
+        self.assertEqual(self.user.version, 1)
+        self.assertEqual(LoginEvent.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(self.tracker.pending(), {'logins': 0, 'seen': 0, 'events': 0})
+
+    def test_older_time_does_not_overwrite_newer(self):
+        newer = timezone.now()
+        User.objects.filter(pk=self.user.pk).update(last_seen=newer)
+        with mock.patch('accounts.activity.timezone.now', return_value=newer - timedelta(minutes=5)):
+            self.tracker.seen(self.user.pk)
+        self.tracker.flush()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_seen, newer)
+
+    def test_events_of_deleted_users_are_skipped(self):
+        self.tracker.login(self.other)
+        self.other.delete()
+
+        self.assertEqual(self.tracker.flush(), 0)
+        self.assertFalse(LoginEvent.objects.exists())
+
+    def test_failed_flush_keeps_buffer(self):
+        self.tracker.login(self.user)
+        with mock.patch.object(self.tracker, '_write', side_effect=DatabaseError), \
+                self.assertLogs('accounts.activity', 'WARNING'):
+            self.assertEqual(self.tracker.flush(), 0)
+
+        self.assertEqual(self.tracker.pending(), {'logins': 1, 'seen': 1, 'events': 1})
+
+    def test_buffers_are_bounded_and_written_in_batches(self):
+        activity = ActivityTracker(interval=0, buffer_size=2)
+        activity.seen(self.user.pk)
+        activity.login(self.other)
+        activity.seen(12345)
+        activity.seen(self.user.pk)
+        third = User.objects.create_user(email='third@example.com')
+        activity.login(third)
+
+        self.assertEqual(activity.pending(), {'logins': 1, 'seen': 2, 'events': 2})
+        with mock.patch('accounts.activity.UPDATE_BATCH_SIZE', 1), \
+                CaptureQueriesContext(connections['default']) as queries:
+            # Событие входа пишется и без обновления last_login
+            self.assertEqual(activity.flush(), 2)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 2)
+        self.assertEqual(User.objects.filter(last_seen__isnull=False).count(), 2)
+
+    def test_login_view_records_event(self):
+        response = self.client.post(reverse('auth_login'), {'email': 'active@example.com',
+                                                            'password': 'Secret-pass-123'},
+                                    HTTP_USER_AGENT='tests', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        tracker.flush()
+
+        event = LoginEvent.objects.get(user=self.user)
+        self.assertEqual(event.user_agent, 'tests')
+        self.assertEqual(event.ip_address, '127.0.0.1')
+
+
+class CalibrateHashersTests(TestCase):
+    def test_writes_env_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, '.env')
+            with open(path, 'w') as f:
+                f.write('DEBUG=false\nSCRYPT_WORK_FACTOR=1\n')
+
+            call_command('calibrate_hashers', hasher=['scrypt'], prefer='scrypt', rounds=1, target_ms=1,
+                         write=path, stdout=io.StringIO())
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+        # Ниже значений Django калибровка не опускается
+        self.assertEqual(lines, ['DEBUG=false', f'SCRYPT_WORK_FACTOR={hashers.ScryptPasswordHasher.work_factor}',
+                                 'PASSWORD_HASHER=scrypt', 'SCRYPT_BLOCK_SIZE=8'])
+
+
+    def test_written_iterations_load_in_hashers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, '.env')
+            # Быстрая машина: PBKDF2 выше значения Django
+            with mock.patch('accounts.management.commands.calibrate_hashers.measure', return_value=0.01):
+                call_command('calibrate_hashers', hasher=['pbkdf2_sha256'], prefer='pbkdf2_sha256', rounds=1,
+                             target_ms=250, write=path, stdout=io.StringIO())
+
+            with open(path) as f:
+                env = dict(line.split('=', 1) for line in f.read().splitlines())
+        self.assertEqual(env['PBKDF2_ITERATIONS'], '2500000')
+        with mock.patch('accounts.hashers.PASSWORD_HASHER_PARAMS',
+                        {'pbkdf2_sha256': {'iterations': env['PBKDF2_ITERATIONS']}}):
+            self.assertEqual(_param('pbkdf2_sha256', 'iterations', 1), 2500000)
+
+class RehashOnLoginTests(TransactionTestCase):
+    # С DB_REPLICA_HOSTS чтения вне транзакции идут на реплики-зеркала
+    databases = '__all__'
+    password = 'Secret-pass-123'
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='old@example.com')
+        self.old_hash = hashers.PBKDF2PasswordHasher().encode(self.password, 'oldsalt', iterations=1000)
+        User.objects.filter(pk=self.user.pk).update(password=self.old_hash)
+
+    def test_login_upgrades_hash_in_background(self):
+        response = self.client.post(reverse('auth_login'), {'email': 'old@example.com', 'password': self.password},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        rehasher.wait()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f'pbkdf2_sha256${PBKDF2PasswordHasher.iterations}$'))
+        self.assertTrue(self.user.check_password(self.password))
+        self.assertEqual(self.user.version, 1)
+
+    def test_changed_password_is_not_overwritten(self):
+        user = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=user.pk).update(password='changed')
+
+        self.assertTrue(rehasher.schedule(user, self.password))
+        rehasher.wait()
+
+        self.assertEqual(User.objects.get(pk=user.pk).password, 'changed')
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    # Второй алиас на ту же тестовую БД; TransactionTestCase, чтобы он видел данные default
+    def setUp(self):
+        connections.settings['replica'] = dict(connections['default'].settings_dict)
+        self.addCleanup(self.remove_replica)
+        self.monitor = ReplicaMonitor(['replica'], max_lag=5, check_interval=60)
+        self.router = ReplicaRouter(['replica'], self.monitor)
+        self.user = User.objects.create_user(email='replica@example.com')
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def test_reads_go_to_replica(self):
+        with mock.patch.object(router, 'routers', [self.router]):
+            user = User.objects.get(pk=self.user.pk)
+
+        self.assertEqual(user._state.db, 'replica')
+        self.assertTrue(self.monitor.status()['replica']['usable'])
+
+    def test_request_is_pinned_to_primary_after_write(self):
+        token = routers.start_request()
+        try:
+            self.assertEqual(self.router.db_for_read(User), 'replica')
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+        finally:
+            routers.finish_request(token)
+
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+
+    def test_transaction_reads_from_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        state = self.monitor.states['replica']
+        state.lag, state.checked_at = 30.0, time.monotonic()
+
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        with mock.patch.object(connections['replica'], 'cursor', side_effect=OperationalError), \
+                self.assertLogs('core.routers', 'WARNING'):
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+        self.assertFalse(self.monitor.status()['replica']['up'])
+
+    def test_cache_fills_read_from_primary(self):
+        blacklist_index.reset()
+        permission_cache.invalidate()
+        activity = ActivityTracker(interval=0)
+        activity.login(self.user)
+
+        with mock.patch.object(router, 'routers', [self.router]), \
+                CaptureQueriesContext(connections['replica']) as replica:
+            blacklist_index.sync(rebuild=True)
+            self.assertNotIn('unknown-jti', blacklist_index)
+            self.assertEqual(self.user.get_all_permissions(), set())
+            self.assertEqual(activity.flush(), 1)
+
+        self.assertEqual(replica.captured_queries, [])
+
+    def test_middleware_scopes_pinning_to_request(self):
+        def view(request):
+            routers.pin_to_primary()
+            self.assertTrue(routers.is_pinned())
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertFalse(routers.is_pinned())
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        login_throttle.store.clear()
+        self.addCleanup(login_throttle.store.clear)
+
+    def test_sliding_window_blocks_with_growing_backoff(self):
+        limiter = SlidingWindowLimiter(LocalStore(), limit=3, window=60, backoff=5, max_backoff=15)
+        now = 6000.0
+        with mock.patch('accounts.throttling.time.time', side_effect=lambda: now):
+            self.assertEqual([limiter.hit('ip:a') for _ in range(3)], [None, None, None])
+            self.assertEqual(limiter.hit('ip:a'), 5)
+            self.assertEqual(limiter.hit('ip:b'), None)
+
+            now += 6
+            self.assertEqual(limiter.hit('ip:a'), 10)
+            now += 11
+            self.assertEqual(limiter.hit('ip:a'), 15)
+
+            limiter.reset('ip:a')
+            self.assertIsNone(limiter.hit('ip:a'))
+
+    def test_local_store_is_bounded(self):
+        store = LocalStore(maxsize=3)
+        for i in range(5):
+            store.incr(f'key{i}', ttl=60)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.get_many(['key0', 'key4']), {'key4': 1})
+
+    def test_rejects_before_lookup_and_hashing(self):
+        User.objects.create_user(email='throttled@example.com', password='pass12345')
+        client = APIClient(REMOTE_ADDR='203.0.113.7')
+        with mock.patch.object(login_throttle.email, 'limit', 1):
+            response = client.post(reverse('auth_login'),
+                                   {'email': 'throttled@example.com', 'password': 'wrong'}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+            for name in ('auth_login', 'token_obtain_pair'):
+                with self.assertNumQueries(0), mock.patch('accounts.hashing.verify_password') as verify:
+                    response = client.post(reverse(name),
+                                           {'email': 'THROTTLED@example.com', 'password': 'pass12345'},
+                                           format='json')
+                self.assertEqual(response.status_code, 429)
+                self.assertIn(response['Retry-After'], ('4', '5'))
+                verify.assert_not_called()
+
+    def test_ip_limit_and_success_reset(self):
+        User.objects.create_user(email='reset@example.com', password='pass12345')
+        client = APIClient(REMOTE_ADDR='203.0.113.8')
+        with mock.patch.object(login_throttle.email, 'limit', 2):
+            client.post(reverse('auth_login'), {'email': 'reset@example.com', 'password': 'wrong'}, format='json')
+            response = client.post(reverse('auth_login'),
+                                   {'email': 'reset@example.com', 'password': 'pass12345'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            # Успешный вход обнулил счётчик email
+            for _ in range(2):
+                response = client.post(reverse('auth_login'),
+                                       {'email': 'reset@example.com', 'password': 'wrong'}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+        with mock.patch.object(login_throttle.ip, 'limit', 0):
+            response = client.post(reverse('auth_login'), {'password': 'x'}, format='json')
+            self.assertEqual(response.status_code, 429)
+            with mock.patch.object(login_throttle, 'trusted_ips', {'203.0.113.8'}):
+                response = client.post(reverse('auth_login'), {'password': 'x'}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_spoofed_forwarded_for_does_not_change_key(self):
+        factory = RequestFactory()
+        request = factory.post('/', REMOTE_ADDR='203.0.113.10', HTTP_X_FORWARDED_FOR='1.2.3.4')
+        self.assertEqual(client_ident(request), '203.0.113.10')
+
+        with mock.patch.object(login_throttle.ip, 'limit', 1), \
+                mock.patch.object(login_throttle, 'trusted_ips', {'10.0.0.1'}):
+            statuses = [
+                APIClient(REMOTE_ADDR='203.0.113.10', HTTP_X_FORWARDED_FOR=forwarded).post(
+                    reverse('auth_login'), {'password': 'x'}, format='json').status_code
+                for forwarded in ('1.2.3.4', '5.6.7.8', '10.0.0.1')
+            ]
+        self.assertEqual(statuses, [400, 429, 429])
+
+    async def test_async_login_is_throttled(self):
+        with mock.patch.object(login_throttle.email, 'limit', 0):
+            response = await self.async_client.post(
+                reverse('async_auth_login'), {'email': 'async-throttled@example.com', 'password': 'x'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class QueryBudgetTests(TransactionTestCase):
+    # TransactionTestCase: без обёртки TestCase в savepoint'ы, как в проде
+    databases = '__all__'
+
+    def test_endpoints_stay_within_query_budget(self):
+        users = benchmark.seed_users(2)
+
+        for endpoint in benchmark.ENDPOINTS:
+            with self.subTest(endpoint=endpoint):
+                payloads = benchmark.build_payloads(endpoint, users, 2)
+                result = benchmark.run_endpoint(endpoint, payloads)
+
+                self.assertEqual(result['errors'], 0)
+                self.assertEqual(result['requests'], 2)
+                self.assertLessEqual(result['queries_per_request']['max'], benchmark.query_budget(endpoint))
+
+    def test_compare_reports(self):
+        def report(rps, p95, queries):
+            return {'results': {'login': {'rps': rps, 'latency_ms': {'p95': p95, 'p99': p95},
+                                          'queries_per_request': {'avg': queries}}}}
+
+        diff = benchmark.compare(report(100, 10, 2), report(80, 12, 3))
+
+        self.assertEqual(diff, {'login': {'rps': -20.0, 'p95_ms': 20.0, 'p99_ms': 20.0, 'queries_per_request': 1}})
@@ -0,0 +1,226 @@
+"""
+Login throttling per client IP and per email, checked before the password is hashed.
+
+Attempts are counted in a sliding window (the current fixed window plus the
+previous one weighted by how much of it still overlaps). A key over its
+limit is blocked for ``LOGIN_THROTTLE_BACKOFF`` seconds, doubling with every
+repeated block up to ``LOGIN_THROTTLE_MAX_BACKOFF``; the client gets 429 with
+Retry-After. A successful login clears the email's counters and strikes.
+
+Counters live in ``LOGIN_THROTTLE_STORE``: :class:`LocalStore` keeps them in
+the worker's memory (limits are then per worker), :class:`CacheStore` in a
+Django cache alias such as Redis, shared by all workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+from core import metrics
+
+LOGIN_THROTTLE_STORE = getattr(settings, 'LOGIN_THROTTLE_STORE', 'accounts.throttling.LocalStore')
+LOGIN_THROTTLE_CACHE = getattr(settings, 'LOGIN_THROTTLE_CACHE', 'default')
+LOGIN_THROTTLE_MAXSIZE = getattr(settings, 'LOGIN_THROTTLE_MAXSIZE', 100000)
+LOGIN_THROTTLE_WINDOW = getattr(settings, 'LOGIN_THROTTLE_WINDOW', 60)
+LOGIN_THROTTLE_IP_LIMIT = getattr(settings, 'LOGIN_THROTTLE_IP_LIMIT', 60)
+LOGIN_THROTTLE_EMAIL_LIMIT = getattr(settings, 'LOGIN_THROTTLE_EMAIL_LIMIT', 10)
+LOGIN_THROTTLE_BACKOFF = getattr(settings, 'LOGIN_THROTTLE_BACKOFF', 5)
+LOGIN_THROTTLE_MAX_BACKOFF = getattr(settings, 'LOGIN_THROTTLE_MAX_BACKOFF', 900)
+LOGIN_THROTTLE_TRUSTED_IPS = getattr(settings, 'LOGIN_THROTTLE_TRUSTED_IPS', [])
+
+KEY_PREFIX = 'login-throttle:'
+
+
+class LocalStore:
+    """Worker-local stand-in for the shared store: the few cache calls the throttle needs.
+
+    Holds at most ``maxsize`` keys; the least recently used ones are dropped first.
+    """
+
+    def __init__(self, maxsize=LOGIN_THROTTLE_MAXSIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # ключ -> (значение, истекает)
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item[0]
+
+    def _put(self, key, value, expires):
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            values = {key: self._get(key, now) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def incr(self, key, ttl):
+        """Adds 1 to ``key``, creating it with expiry ``ttl`` if missing; returns the new value."""
+        now = time.monotonic()
+        with self._lock:
+            value = self._get(key, now)
+            if value is None:
+                self._put(key, 1, now + ttl)
+                return 1
+            self._data[key] = (value + 1, self._data[key][1])
+            return value + 1
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._put(key, value, time.monotonic() + ttl)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheStore:
+    """The same calls on a Django cache alias (Redis, Memcached) shared by all workers."""
+
+    def __init__(self, cache_alias=LOGIN_THROTTLE_CACHE):
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def incr(self, key, ttl):
+        cache = self.cache
+        if cache.add(key, 1, timeout=ttl):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Ключ истёк между add и incr
+            cache.set(key, 1, timeout=ttl)
+            return 1
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, timeout=ttl)
+
+    def delete_many(self, keys):
+        self.cache.delete_many(keys)
+
+
+class SlidingWindowLimiter:
+    def __init__(self, store, limit, window=LOGIN_THROTTLE_WINDOW, backoff=LOGIN_THROTTLE_BACKOFF,
+                 max_backoff=LOGIN_THROTTLE_MAX_BACKOFF):
+        self.store = store
+        self.limit = limit
+        self.window = window
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def _keys(self, key, index):
+        key = KEY_PREFIX + key
+        return f'{key}:{index}', f'{key}:{index - 1}', f'{key}:blocked', f'{key}:strikes'
+
+    def hit(self, key):
+        """Counts an attempt for ``key``; returns the seconds to wait if it is over the limit, else None."""
+        now = time.time()
+        index = int(now // self.window)
+        current, previous, blocked, strikes = self._keys(key, index)
+
+        values = self.store.get_many([current, previous, blocked])
+        blocked_until = values.get(blocked)
+        if blocked_until is not None and blocked_until > now:
+            return blocked_until - now
+
+        overlap = 1 - (now - index * self.window) / self.window
+        if values.get(previous, 0) * overlap + values.get(current, 0) >= self.limit:
+            # Каждая следующая блокировка вдвое длиннее; отклонённые попытки
+            # не считаются, но и окно не успевает остыть
+            count = self.store.incr(strikes, ttl=self.max_backoff * 2)
+            wait = min(self.backoff * 2 ** min(count - 1, 20), self.max_backoff)
+            self.store.set(blocked, now + wait, ttl=wait)
+            return wait
+
+        self.store.incr(current, ttl=self.window * 2)
+        return None
+
+    def reset(self, key):
+        index = int(time.time() // self.window)
+        self.store.delete_many(self._keys(key, index))
+
+
+class LoginThrottle:
+    def __init__(self, store=None, ip_limit=LOGIN_THROTTLE_IP_LIMIT, email_limit=LOGIN_THROTTLE_EMAIL_LIMIT,
+                 trusted_ips=LOGIN_THROTTLE_TRUSTED_IPS, **options):
+        self.store = store if store is not None else import_string(LOGIN_THROTTLE_STORE)()
+        self.ip = SlidingWindowLimiter(self.store, ip_limit, **options)
+        self.email = SlidingWindowLimiter(self.store, email_limit, **options)
+        self.trusted_ips = frozenset(trusted_ips)
+
+    def check(self, ident, email=None, remote_addr=None):
+        """Counts a login attempt; returns the seconds to wait when the IP or the email is throttled.
+
+        The IP limit is skipped when ``remote_addr`` (the peer address, never a
+        client-supplied header) is one of ``trusted_ips``.
+        """
+        with metrics.timed('throttle'):
+            if remote_addr not in self.trusted_ips:
+                wait = self.ip.hit(f'ip:{ident}')
+                if wait is not None:
+                    metrics.registry.inc('login_throttled_total', (('scope', 'ip'),))
+                    return wait
+            if isinstance(email, str) and email:
+                wait = self.email.hit(f'email:{email.strip().lower()}')
+                if wait is not None:
+                    metrics.registry.inc('login_throttled_total', (('scope', 'email'),))
+                    return wait
+            return None
+
+    def succeeded(self, email):
+        self.email.reset(f'email:{email.strip().lower()}')
+
+
+login_throttle = LoginThrottle()
+
+
+def client_ident(request):
+    # Как у throttle-классов DRF: REMOTE_ADDR, а за NUM_PROXIES прокси - адрес из
+    # X-Forwarded-For, записанный ближайшим из них. Без NUM_PROXIES DRF взял бы
+    # заголовок целиком, и клиент выбирал бы себе ключ сам
+    return BaseThrottle().get_ident(request)
+
+
+def check_request(request, email):
+    return login_throttle.check(client_ident(request), email, remote_addr=request.META.get('REMOTE_ADDR'))
+
+
+class LoginRateThrottle(BaseThrottle):
+    """DRF throttle for the login views: runs before the serializer, i.e. before any DB lookup or hashing."""
+
+    def allow_request(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        self._wait = check_request(request, email)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
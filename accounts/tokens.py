@@ -0,0 +1,58 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from core import metrics
+
+from .blacklist import blacklist_index
+
+
+class AccessToken(tokens.AccessToken):
+    def __str__(self):
+        with metrics.timed('jwt'):
+            return super().__str__()
+
+
+class RefreshToken(tokens.RefreshToken):
+    """RefreshToken that answers blacklist checks from the in-memory JTI index."""
+
+    access_token_class = AccessToken
+
+    def __str__(self):
+        with metrics.timed('jwt'):
+            return super().__str__()
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_index:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_index.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+    # Async-варианты for_user() и blacklist() на async ORM (accounts.async_views)
+    @classmethod
+    async def afor_user(cls, user):
+        token = super(tokens.BlacklistMixin, cls).for_user(user)
+        await OutstandingToken.objects.acreate(
+            user=user,
+            jti=token[api_settings.JTI_CLAIM],
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token['exp']),
+        )
+        return token
+
+    async def ablacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        token, _ = await OutstandingToken.objects.aget_or_create(
+            jti=jti,
+            defaults={'token': str(self), 'expires_at': datetime_from_epoch(self.payload['exp'])},
+        )
+        result = await BlacklistedToken.objects.aget_or_create(token=token)
+        blacklist_index.add(jti)
+        return result
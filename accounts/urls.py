@@ -1,12 +1,12 @@
 from django.urls import path
 from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView
 )
 
+from accounts import async_views
 from accounts.views import RegisterView, LoginView, LogoutView, LogoutAllView, ChangePasswordView, \
-    DatabaseHealthCheckView
+    LivenessView, ReadinessView, MeView, TokenObtainPairView
 
 urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='auth_register'),
@@ -14,9 +14,21 @@ urlpatterns = [
     path('auth/logout/', LogoutView.as_view(), name='auth_logout'),
     path('auth/logout-all/', LogoutAllView.as_view(), name='auth_logout_all'),
     path('auth/password/change/', ChangePasswordView.as_view(), name='auth_password_change'),
+    path('auth/me/', MeView.as_view(), name='auth_me'),
 
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
-    path('health-check/', DatabaseHealthCheckView.as_view(), name='db-health-check'),
+    path('health/live/', LivenessView.as_view(), name='health_live'),
+    path('health/ready/', ReadinessView.as_view(), name='health_ready'),
+    # Старый адрес проверки БД, теперь это readiness
+    path('health-check/', ReadinessView.as_view(), name='db-health-check'),
+
+    # Async-варианты для ASGI-сервера (accounts.async_views)
+    path('async/auth/register/', async_views.RegisterView.as_view(), name='async_auth_register'),
+    path('async/auth/login/', async_views.LoginView.as_view(), name='async_auth_login'),
+    path('async/auth/logout/', async_views.LogoutView.as_view(), name='async_auth_logout'),
+    path('async/auth/logout-all/', async_views.LogoutAllView.as_view(), name='async_auth_logout_all'),
+    path('async/health/live/', async_views.LivenessView.as_view(), name='async_health_live'),
+    path('async/health/ready/', async_views.ReadinessView.as_view(), name='async_health_ready'),
 ]
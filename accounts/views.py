@@ -1,13 +1,25 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import CreateAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework import status, serializers
 from rest_framework.response import Response
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
-from rest_framework_simplejwt.tokens import RefreshToken
+from .activity import tracker
+from .authentication import invalidate_user
+from .hashing import fail_fast
+from .revocation import revoke_tokens
+from .throttling import LoginRateThrottle, login_throttle
+from .tokens import RefreshToken
 from .serializers import RegisterSerializer, LoginSerializer, LogoutSerializer, ChangePasswordSerializer
 from django.contrib.auth import get_user_model
-from django.db import connection, DatabaseError
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework_simplejwt import views as jwt_views
+from .health import readiness_probe
 
 User = get_user_model()
 
@@ -16,17 +28,31 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'phone', 'address']
+        read_only_fields = ['id', 'email']
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-class RegisterView(CreateAPIView):
+
+class FailFastHashingMixin:
+    """A full hashing pool answers 503 with Retry-After instead of hashing inline."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with fail_fast():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class RegisterView(FailFastHashingMixin, CreateAPIView):
     serializer_class = RegisterSerializer
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-
-        refresh = RefreshToken.for_user(user)
+        refresh = serializer.refresh
 
         return Response({
             'user': {
@@ -39,8 +65,9 @@ class RegisterView(CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
-class LoginView(APIView):
+class LoginView(FailFastHashingMixin, APIView):
     serializer_class = LoginSerializer
+    throttle_classes = [LoginRateThrottle]
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -48,6 +75,8 @@ class LoginView(APIView):
 
         user = serializer.validated_data['user']
         refresh = RefreshToken.for_user(user)
+        tracker.login(user, request)
+        login_throttle.succeeded(user.email)
 
         return Response({
             'access': str(refresh.access_token),
@@ -61,20 +90,26 @@ class LoginView(APIView):
         }, status=status.HTTP_200_OK)
 
 
-class ChangePasswordView(APIView):
+class TokenObtainPairView(FailFastHashingMixin, jwt_views.TokenObtainPairView):
+    throttle_classes = [LoginRateThrottle]
+
+
+class ChangePasswordView(FailFastHashingMixin, APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ChangePasswordSerializer
 
     def post(self, request):
         serializer = ChangePasswordSerializer(data=request.data)
         if serializer.is_valid():
-            user = request.user
+            # request.user - снимок из кэша аутентификации; save() по нему вернул бы
+            # в строку устаревшие is_staff, профиль и version
+            user = User.objects.using(DEFAULT_DB_ALIAS).get(pk=request.user.pk)
             if not user.check_password(serializer.data.get('old_password')):
                 return Response({'old_password': 'Incorrect password'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
             user.set_password(serializer.data.get('new_password'))
-            user.save()
+            user.save(update_fields=['password'])
             return Response({'message': 'Password successfully changed'},
                             status=status.HTTP_200_OK)
 
@@ -97,23 +132,95 @@ class LogoutAllView(APIView):
     serializer_class = LogoutSerializer
 
     def post(self, request):
-        tokens = OutstandingToken.objects.filter(user=request.user)
-        for token in tokens:
-            BlacklistedToken.objects.get_or_create(token=token)
+        revoke_tokens([request.user.pk])
 
         return Response({'message': 'Successfully logged out from all devices'}, status=status.HTTP_205_RESET_CONTENT)
 
 
-class DatabaseHealthCheckView(APIView):
+class MeView(APIView):
+    """
+    Profile of the current user. ``?fields=`` limits the columns loaded and
+    returned; the ETag follows ``CustomUser.version``, so ``If-None-Match``
+    answers 304 without serializing and ``If-Match`` guards PATCH.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = UserSerializer
+
+    def get_fields(self, request):
+        allowed = UserSerializer.Meta.fields
+        if not request.query_params.get('fields'):
+            return allowed
+        fields = [name.strip() for name in request.query_params['fields'].split(',') if name.strip()]
+        unknown = [name for name in fields if name not in allowed]
+        if unknown:
+            raise ValidationError({'fields': [f'Unknown field: {name}' for name in unknown]})
+        return fields
+
+    def etag(self, user):
+        return f'"{user.pk}-{user.version}"'
+
+    def finalize(self, response, user):
+        response['ETag'] = self.etag(user)
+        # Ответ зависит от токена; кэшировать можно, но только с ревалидацией
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    @extend_schema(parameters=[OpenApiParameter(
+        'fields', str, description='Comma-separated subset of ' + ', '.join(UserSerializer.Meta.fields))])
+    def get(self, request):
+        fields = self.get_fields(request)
+        user = User.objects.only('version', *fields).get(pk=request.user.pk)
+
+        # Слабое сравнение (RFC 9110): W/ от прокси с gzip не мешает
+        etags = [etag.removeprefix('W/') for etag in parse_etags(request.headers.get('If-None-Match', ''))]
+        if self.etag(user) in etags or '*' in etags:
+            return self.finalize(Response(status=status.HTTP_304_NOT_MODIFIED), user)
+
+        return self.finalize(Response(UserSerializer(user, fields=fields).data), user)
+
+    def patch(self, request):
+        serializer = UserSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+        users = User.objects.filter(pk=request.user.pk)
+        if_match = request.headers.get('If-Match')
+        if if_match is not None and if_match.strip() != '*':
+            etags = parse_etags(if_match)
+            versions = [etag.rpartition('-')[2].rstrip('"') for etag in etags if etag.startswith('"')]
+            if len(versions) != 1 or not versions[0].isdigit():
+                return Response({'detail': 'If-Match must be a single ETag of this resource.'},
+                                status=status.HTTP_412_PRECONDITION_FAILED)
+            users = users.filter(version=int(versions[0]))
+
+        # Проверка версии и запись одним UPDATE, без гонки между ними
+        if not users.update(**serializer.validated_data, version=F('version') + 1):
+            return Response({'detail': 'The profile has been modified since it was fetched.'},
+                            status=status.HTTP_412_PRECONDITION_FAILED)
+        # update() не шлёт post_save
+        invalidate_user(request.user.pk)
+
+        user = User.objects.get(pk=request.user.pk)
+        return self.finalize(Response(UserSerializer(user).data), user)
+
+
+class LivenessView(APIView):
+    """Process is up and serving requests; never touches the database."""
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response({"status": "ok"}, status=status.HTTP_200_OK)
+
+
+class ReadinessView(APIView):
+    """Database reachability, latency and migration state (cached for a few seconds), plus connection stats."""
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
     def get(self, request):
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1;")
-                result = cursor.fetchone()
-                if result and result[0] == 1:
-                    return Response({"status": "ok", "db": "connected"}, status=status.HTTP_200_OK)
-                else:
-                    return Response({"status": "error", "db": "no response"},
-                                    status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        except DatabaseError as e:
-            return Response({"status": "error", "db": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        result = readiness_probe.check_with_stats()
+        code = status.HTTP_200_OK if result['status'] == 'ok' else status.HTTP_503_SERVICE_UNAVAILABLE
+        return Response(result, status=code)
@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# До загрузки настроек: под ASGI они отключают постоянные соединения (DB_CONN_MAX_AGE)
+os.environ['DJANGO_ASGI'] = 'true'
 
 application = get_asgi_application()
+
+# Процессы пула хеширования стартуют при загрузке приложения, а не на первом
+# логине внутри event loop. Async-код ждёт результат через
+# accounts.hashing.amake_password/averify_password, не блокируя loop.
+from accounts.activity import tracker as activity_tracker  # noqa: E402
+from accounts.hashing import pool as hashing_pool  # noqa: E402
+
+hashing_pool.start()
+# Фоновая запись last_login/last_seen и событий входа
+activity_tracker.start()
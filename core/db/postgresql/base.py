@@ -0,0 +1,16 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from core.dbstats import record_connect
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that records how long opening a connection (the TCP/TLS/auth handshake) takes."""
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            record_connect(self.alias, time.perf_counter() - started)
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DB_STATS_LOG_INTERVAL = getattr(settings, 'DB_STATS_LOG_INTERVAL', 0)
+
+
+class ConnectionStats:
+    """Connection churn of one database alias in this worker."""
+
+    def __init__(self):
+        self.opened = 0
+        self.connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+        self.requests = 0
+        self.reused = 0
+
+    def snapshot(self):
+        return {
+            'opened': self.opened,
+            'requests': self.requests,
+            'reused': self.reused,
+            'avg_connect_ms': round(self.connect_seconds / self.opened * 1000, 2) if self.opened else None,
+            'max_connect_ms': round(self.max_connect_seconds * 1000, 2),
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+_last_logged = time.monotonic()
+
+
+def _get(alias):
+    stats = _stats.get(alias)
+    if stats is None:
+        with _lock:
+            stats = _stats.setdefault(alias, ConnectionStats())
+    return stats
+
+
+def record_connect(alias, seconds):
+    stats = _get(alias)
+    stats.connect_seconds += seconds
+    stats.max_connect_seconds = max(stats.max_connect_seconds, seconds)
+
+
+def connection_stats(alias=None):
+    if alias is not None:
+        return _get(alias).snapshot()
+    return {alias: stats.snapshot() for alias, stats in list(_stats.items())}
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    _get(connection.alias).opened += 1
+
+
+@receiver(request_started)
+def count_reuse(sender, **kwargs):
+    # Срабатывает после close_old_connections, так что видно, пережило ли
+    # соединение CONN_MAX_AGE/проверку здоровья
+    for connection in connections.all(initialized_only=True):
+        stats = _get(connection.alias)
+        stats.requests += 1
+        if connection.connection is not None:
+            stats.reused += 1
+
+
+@receiver(request_finished)
+def log_connection_stats(sender, **kwargs):
+    global _last_logged
+    if not DB_STATS_LOG_INTERVAL:
+        return
+    now = time.monotonic()
+    if now - _last_logged >= DB_STATS_LOG_INTERVAL:
+        _last_logged = now
+        logger.info('DB connections: %s', connection_stats())
+
+
+@registry.collector
+def connection_metrics():
+    for alias, stats in list(_stats.items()):
+        labels = (('alias', alias),)
+        yield 'db_connections_opened_total', labels, stats.opened
+        yield 'db_connections_reused_total', labels, stats.reused
+        yield 'db_connect_duration_seconds_total', labels, stats.connect_seconds
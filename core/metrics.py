@@ -0,0 +1,295 @@
+"""
+Per-worker request metrics rendered in the Prometheus text format.
+
+Every worker keeps its own counters in memory. With ``METRICS_DIR`` set,
+workers also dump them to ``<METRICS_DIR>/<pid>-<start>.json`` at most
+once per ``METRICS_FLUSH_INTERVAL`` seconds, and ``/metrics`` sums the
+files of all workers, so any gunicorn worker can answer the scrape.
+"""
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_request_duration_seconds': 'Request latency by view.',
+    'db_queries_total': 'SQL queries executed by view.',
+    'db_query_duration_seconds_total': 'Time spent in SQL queries by view.',
+    'password_hash_total': 'Password hash/verify calls by view.',
+    'password_hash_duration_seconds_total': 'Time spent waiting for password hashing by view.',
+    'password_hashing_inline_total': 'Hashes run inline outside the API because the hashing pool was full.',
+    'jwt_sign_total': 'JWTs signed by view.',
+    'jwt_sign_duration_seconds_total': 'Time spent signing JWTs by view.',
+    'login_throttle_checks_total': 'Login throttle checks by view.',
+    'login_throttle_duration_seconds_total': 'Time spent in login throttle checks by view.',
+    'login_throttled_total': 'Login attempts rejected by the throttle.',
+    'auth_cache_hits_total': 'Authentication cache hits.',
+    'auth_cache_misses_total': 'Authentication cache misses.',
+    'permission_cache_hits_total': 'Permission cache hits.',
+    'permission_cache_misses_total': 'Permission cache misses.',
+    'db_connections_opened_total': 'Database connections opened.',
+    'db_connections_reused_total': 'Requests that started with an open database connection.',
+    'db_connect_duration_seconds_total': 'Time spent opening database connections.',
+    'db_replica_up': 'Whether the read replica answered its last check.',
+    'db_replica_lag_seconds': 'Replication lag of the read replica at its last check.',
+    'activity_pending': 'Logins, last-seen updates and login events waiting to be written.',
+    'activity_events_flushed_total': 'Login events written to the database.',
+    'activity_events_dropped_total': 'Login events dropped because the buffer was full.',
+    'activity_updates_dropped_total': 'last_seen/last_login updates dropped because the buffer was full.',
+}
+
+# Вид замера (он же метка в Server-Timing) -> (счётчик вызовов, счётчик секунд)
+TIMED_KINDS = {
+    'db': ('db_queries_total', 'db_query_duration_seconds_total'),
+    'hash': ('password_hash_total', 'password_hash_duration_seconds_total'),
+    'jwt': ('jwt_sign_total', 'jwt_sign_duration_seconds_total'),
+    'throttle': ('login_throttle_checks_total', 'login_throttle_duration_seconds_total'),
+}
+
+
+class Registry:
+    def __init__(self):
+        self.counters = defaultdict(lambda: defaultdict(float))
+        self.histograms = defaultdict(dict)
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1.0):
+        with self._lock:
+            self.counters[name][labels] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self.histograms[name].get(labels)
+            if histogram is None:
+                histogram = self.histograms[name][labels] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def collector(self, func):
+        """Registers ``func() -> [(name, labels, value), ...]`` evaluated on every snapshot."""
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self):
+        with self._lock:
+            counters = {name: [[list(labels), value] for labels, value in series.items()]
+                        for name, series in self.counters.items()}
+            histograms = {name: [[list(labels), list(values)] for labels, values in series.items()]
+                          for name, series in self.histograms.items()}
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                counters.setdefault(name, []).append([list(labels), value])
+        return {'counters': counters, 'histograms': histograms}
+
+
+registry = Registry()
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request():
+    timings = {}
+    return timings, _request_timings.set(timings)
+
+
+def finish_request(token):
+    _request_timings.reset(token)
+
+
+def record(kind, seconds):
+    timings = _request_timings.get()
+    if timings is None:
+        # Вне запроса (команды, фоновые потоки)
+        count_name, seconds_name = TIMED_KINDS[kind]
+        registry.inc(count_name, (('view', '-'),))
+        registry.inc(seconds_name, (('view', '-'),), seconds)
+        return
+    total = timings.get(kind)
+    if total is None:
+        timings[kind] = [1, seconds]
+    else:
+        total[0] += 1
+        total[1] += seconds
+
+
+@contextmanager
+def timed(kind):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - started)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record('db', time.perf_counter() - started)
+
+
+def install_sql_wrapper(connection):
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def finish_view(view, method, status, seconds, timings):
+    labels = (('view', view),)
+    registry.observe('http_request_duration_seconds', labels + (('method', method), ('status', str(status))),
+                     seconds)
+    for kind, (count, spent) in timings.items():
+        count_name, seconds_name = TIMED_KINDS[kind]
+        registry.inc(count_name, labels, count)
+        registry.inc(seconds_name, labels, spent)
+
+
+def server_timing(seconds, timings):
+    parts = [f'{kind};dur={spent * 1000:.1f};desc="{count}"' for kind, (count, spent) in timings.items()]
+    parts.append(f'total;dur={seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class _Flusher:
+    def __init__(self):
+        self.path = None
+        self.flushed_at = 0.0
+        self.lock = threading.Lock()
+
+    def maybe_flush(self):
+        if not METRICS_DIR or time.monotonic() - self.flushed_at < METRICS_FLUSH_INTERVAL:
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.flush()
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        if not METRICS_DIR:
+            return
+        if self.path is None:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            self.path = os.path.join(METRICS_DIR, f'{os.getpid()}-{int(time.time() * 1000)}.json')
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(tmp, self.path)
+        self.flushed_at = time.monotonic()
+
+
+flusher = _Flusher()
+
+
+def archive_worker(pid):
+    """Folds the dump of an exited worker into archive.json.
+
+    Counters of dead workers must survive (they are cumulative), but worker
+    restarts (max_requests) would otherwise leave a file per process behind.
+    Called from the gunicorn master's child_exit hook.
+    """
+    if not METRICS_DIR:
+        return
+    import fcntl
+
+    paths = glob.glob(os.path.join(METRICS_DIR, f'{pid}-*.json'))
+    if not paths:
+        return
+    archive = os.path.join(METRICS_DIR, 'archive.json')
+    with open(os.path.join(METRICS_DIR, 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        snapshots = []
+        for path in [archive] + paths:
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        counters, histograms = merge(snapshots)
+        data = {
+            'counters': {name: [[list(labels), value] for labels, value in series.items()]
+                         for name, series in counters.items()},
+            'histograms': {name: [[list(labels), values] for labels, values in series.items()]
+                           for name, series in histograms.items()},
+        }
+        with open(f'{archive}.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(f'{archive}.tmp', archive)
+        for path in paths:
+            os.remove(path)
+
+
+def merge(snapshots):
+    counters = defaultdict(lambda: defaultdict(float))
+    histograms = defaultdict(dict)
+    for snapshot in snapshots:
+        for name, series in snapshot['counters'].items():
+            for labels, value in series:
+                counters[name][tuple(map(tuple, labels))] += value
+        for name, series in snapshot['histograms'].items():
+            for labels, values in series:
+                key = tuple(map(tuple, labels))
+                current = histograms[name].get(key)
+                histograms[name][key] = values if current is None else [a + b for a, b in zip(current, values)]
+    return counters, histograms
+
+
+def collect_all():
+    """This worker's live counters plus the last dump of every other worker."""
+    snapshots = [registry.snapshot()]
+    if METRICS_DIR:
+        flusher.flush()
+        for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+            if path == flusher.path:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+def render():
+    counters, histograms = collect_all()
+    lines = []
+    for name, series in sorted(histograms.items()):
+        lines.append(f'# HELP {name} {HELP.get(name, name)}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, values in sorted(series.items()):
+            # observe() уже хранит накопительные значения по бакетам
+            for bound, count in zip(BUCKETS, values):
+                lines.append(f'{name}_bucket{{{_format_labels(labels + (("le", bound),))}}} {count}')
+            lines.append(f'{name}_bucket{{{_format_labels(labels + (("le", "+Inf"),))}}} {values[-1]}')
+            lines.append(f'{name}_sum{{{_format_labels(labels)}}} {values[-2]}')
+            lines.append(f'{name}_count{{{_format_labels(labels)}}} {values[-1]}')
+    for name, series in sorted(counters.items()):
+        lines.append(f'# HELP {name} {HELP.get(name, name)}')
+        lines.append(f'# TYPE {name} counter')
+        for labels, value in sorted(series.items()):
+            lines.append(f'{name}{{{_format_labels(labels)}}} {value}')
+    return '\n'.join(lines) + '\n'
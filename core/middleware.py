@@ -0,0 +1,207 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from core import metrics, routers
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    metrics.install_sql_wrapper(connection)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL queries, password hashing and JWT signing per view
+    (see core.metrics) and reports them to the client in Server-Timing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = self._start()
+        timings, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        return self._finish(request, response, started, timings)
+
+    async def __acall__(self, request):
+        started = self._start()
+        timings, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        return self._finish(request, response, started, timings)
+
+    def _start(self):
+        # Соединения, открытые до подключения сигнала (например, в тестах)
+        for connection in connections.all(initialized_only=True):
+            metrics.install_sql_wrapper(connection)
+        return time.perf_counter()
+
+    def _finish(self, request, response, started, timings):
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        metrics.finish_view(view, request.method, response.status_code, seconds, timings)
+        response['Server-Timing'] = metrics.server_timing(seconds, timings)
+        metrics.flusher.maybe_flush()
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Scopes core.routers.ReplicaRouter's "reads go to the primary after a write" to one request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = routers.start_request()
+        try:
+            return self.get_response(request)
+        finally:
+            routers.finish_request(token)
+
+    async def __acall__(self, request):
+        token = routers.start_request()
+        try:
+            return await self.get_response(request)
+        finally:
+            routers.finish_request(token)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can run in an async middleware chain.
+
+    WhiteNoise 6.6 is sync-only, and under ASGI a sync middleware makes Django
+    pass every request through its single sync thread, so one worker would
+    handle requests one at a time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # DEBUG: поиск файла идёт по диску
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class FastLaneMiddleware:
+    """
+    Runs ``FULL_STACK_MIDDLEWARE`` (sessions, CSRF, auth, messages) for every
+    request except those under ``FAST_LANE_PREFIXES``.
+
+    The JWT API is stateless: DRF authenticates from the Authorization
+    header and its views are CSRF-exempt, so for ``/api/`` the session
+    lookup, CSRF token handling and message storage are pure overhead.
+    Admin and the API docs (``FAST_LANE_EXCLUDED_PREFIXES``) keep the full stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefixes = tuple(settings.FAST_LANE_PREFIXES)
+        self.excluded = tuple(settings.FAST_LANE_EXCLUDED_PREFIXES)
+
+        # Цепочка как в BaseHandler.load_middleware: первый в списке - внешний
+        handler = get_response
+        instances = []
+        for path in reversed(settings.FULL_STACK_MIDDLEWARE):
+            handler = import_string(path)(handler)
+            instances.insert(0, handler)
+        self.full_stack = handler
+        # process_view/process_exception вызывает Django, они делегируются внутренним middleware
+        self.view_middleware = [m.process_view for m in instances if hasattr(m, 'process_view')]
+        self.exception_middleware = [m.process_exception for m in reversed(instances)
+                                     if hasattr(m, 'process_exception')]
+
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Иначе Django обернёт sync-метод в sync_to_async, и каждый запрос
+            # к API проходил бы через единственный sync-поток
+            self.process_view = self.aprocess_view
+            self.process_exception = self.aprocess_exception
+
+    def is_fast_lane(self, request):
+        path = request.path_info
+        return path.startswith(self.prefixes) and not path.startswith(self.excluded)
+
+    def __call__(self, request):
+        if self.is_fast_lane(request):
+            return self.get_response(request)
+        return self.full_stack(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_fast_lane(request):
+            return None
+        for process_view in self.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_exception(self, request, exception):
+        if self.is_fast_lane(request):
+            return None
+        for process_exception in self.exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_fast_lane(request):
+            return None
+        return await sync_to_async(FastLaneMiddleware.process_view)(self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_exception(self, request, exception):
+        if self.is_fast_lane(request):
+            return None
+        return await sync_to_async(FastLaneMiddleware.process_exception)(self, request, exception)
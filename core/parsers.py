@@ -0,0 +1,37 @@
+"""
+orjson-backed JSONParser (optional dependency).
+
+Falls back to DRF's JSONParser for non-UTF-8 bodies, when orjson is not
+installed, when orjson rejects the input and for bodies with numbers that
+may not fit 64 bits (orjson would turn them into floats), so errors and
+edge cases are handled exactly as before.
+"""
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# 19 цифр подряд - возможное целое больше int64 (или просто длинная строка из цифр)
+_LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if _LONG_NUMBER.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
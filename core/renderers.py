@@ -0,0 +1,45 @@
+"""
+orjson-backed JSONRenderer (optional dependency).
+
+Output matches rest_framework.renderers.JSONRenderer: datetimes, dates,
+times, Decimals, lazy translation strings and other non-native types go
+through DRF's own JSONEncoder.default, and U+2028/U+2029 are escaped the
+same way. Whatever orjson cannot produce identically (indentation other
+than 2, non-compact or ASCII-only output, integers over 64 bits) is
+rendered by the stdlib path. Without orjson installed this is exactly
+DRF's JSONRenderer. Known difference: floats use the shortest round-trip
+form (1e-7 instead of 1e-07), and NaN becomes null instead of an error.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is None:
+            options = OPTIONS
+        elif indent == 2:
+            options = OPTIONS | orjson.OPT_INDENT_2
+        else:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=options)
+        except orjson.JSONEncodeError:
+            # Например, int больше 64 бит - stdlib справится или выдаст ту же ошибку, что DRF
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,178 @@
+"""
+Read replicas for read-only queries (``DATABASE_REPLICAS``).
+
+Reads go round-robin to the replicas that are up and whose replication lag
+is under ``DB_REPLICA_MAX_LAG`` seconds; each replica is checked at most
+once per ``DB_REPLICA_CHECK_INTERVAL`` per worker. As soon as a request
+writes, and inside transactions on the primary, its reads stay on the
+primary, so a request always sees its own writes. The request scope comes
+from core.middleware.ReplicaRoutingMiddleware.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICAS = getattr(settings, 'DATABASE_REPLICAS', [])
+DB_REPLICA_MAX_LAG = getattr(settings, 'DB_REPLICA_MAX_LAG', 5.0)
+DB_REPLICA_CHECK_INTERVAL = getattr(settings, 'DB_REPLICA_CHECK_INTERVAL', 5.0)
+
+# Отставание реплики в секундах; 0, если она применила всё, что получила
+# (иначе на простаивающем primary отставание росло бы само по себе)
+POSTGRES_LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+_request = contextvars.ContextVar('db_routing', default=None)
+
+
+def start_request():
+    # Изменяемый словарь, а не значение: запись из потока sync_to_async (async ORM)
+    # должна быть видна и дальше в запросе
+    return _request.set({'pinned': False})
+
+
+def finish_request(token):
+    _request.reset(token)
+
+
+def pin_to_primary():
+    state = _request.get()
+    if state is not None:
+        state['pinned'] = True
+
+
+def is_pinned():
+    state = _request.get()
+    return state is not None and state['pinned']
+
+
+class _ReplicaState:
+    def __init__(self):
+        self.up = True
+        self.lag = None
+        self.checked_at = None
+
+
+class ReplicaMonitor:
+    """Availability and lag of the replicas, re-checked at most every ``check_interval`` seconds."""
+
+    def __init__(self, replicas=DATABASE_REPLICAS, max_lag=DB_REPLICA_MAX_LAG,
+                 check_interval=DB_REPLICA_CHECK_INTERVAL):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.states = {alias: _ReplicaState() for alias in replicas}
+        self._lock = threading.Lock()
+
+    def usable(self, alias):
+        state = self.states[alias]
+        now = time.monotonic()
+        if state.checked_at is None or now - state.checked_at >= self.check_interval:
+            # Проверяет один поток, остальные пока видят прошлый результат
+            if self._lock.acquire(blocking=state.checked_at is None):
+                try:
+                    if state.checked_at is None or now - state.checked_at >= self.check_interval:
+                        self._check(alias, state, now)
+                finally:
+                    self._lock.release()
+        return state.up and (state.lag is None or state.lag <= self.max_lag)
+
+    def _check(self, alias, state, now):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(POSTGRES_LAG_SQL if connection.vendor == 'postgresql' else 'SELECT 0')
+                lag = cursor.fetchone()[0]
+        except (OperationalError, InterfaceError):
+            if state.up:
+                logger.warning('Replica %s is unavailable, reading from the primary', alias, exc_info=True)
+            state.up, state.lag = False, None
+        else:
+            state.lag = float(lag or 0)
+            if state.lag > self.max_lag:
+                logger.warning('Replica %s lags %.1fs behind, reading from the primary', alias, state.lag)
+            state.up = True
+        state.checked_at = now
+
+    def mark_down(self, alias):
+        """Called when a query on the replica fails; it is re-checked after ``check_interval``."""
+        state = self.states.get(alias)
+        if state is not None:
+            state.up = False
+            state.checked_at = time.monotonic()
+
+    def status(self):
+        return {alias: {'up': state.up, 'lag_seconds': state.lag,
+                        'usable': state.up and (state.lag is None or state.lag <= self.max_lag)}
+                for alias, state in self.states.items()}
+
+
+replica_monitor = ReplicaMonitor()
+
+
+class ReplicaRouter:
+    def __init__(self, replicas=None, monitor=None):
+        self.replicas = list(DATABASE_REPLICAS if replicas is None else replicas)
+        self.monitor = monitor or replica_monitor
+        self.aliases = {DEFAULT_DB_ALIAS, *self.replicas}
+        self._next = itertools.count()
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        start = next(self._next)
+        for i in range(len(self.replicas)):
+            alias = self.replicas[(start + i) % len(self.replicas)]
+            if self.monitor.usable(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии primary, объекты с них и с primary можно связывать
+        if obj1._state.db in self.aliases and obj2._state.db in self.aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in self.replicas:
+            return False
+        return None
+
+
+def _replica_errors(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError):
+        # Следующие чтения уйдут на primary, не дожидаясь плановой проверки
+        replica_monitor.mark_down(context['connection'].alias)
+        raise
+
+
+@receiver(connection_created)
+def watch_replica(sender, connection, **kwargs):
+    if connection.alias in replica_monitor.states and _replica_errors not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_replica_errors)
+
+
+@registry.collector
+def replica_metrics():
+    for alias, status in replica_monitor.status().items():
+        labels = (('alias', alias),)
+        yield 'db_replica_up', labels, int(status['up'])
+        if status['lag_seconds'] is not None:
+            yield 'db_replica_lag_seconds', labels, status['lag_seconds']
@@ -0,0 +1,167 @@
+"""
+Precomputed OpenAPI schema for /api/schema/.
+
+drf-spectacular walks every view and serializer on each request to the
+schema view. Here the schema is generated once per code version, either by
+the ``build_schema`` command (at image build) or on the first request, and
+kept in memory and in ``SCHEMA_CACHE_DIR`` as rendered YAML/JSON plus gzip.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from importlib.metadata import version as package_version
+
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE_DIR = getattr(settings, 'SCHEMA_CACHE_DIR', None)
+
+RENDERERS = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}
+
+
+def code_version():
+    """
+    ``CODE_VERSION`` from the environment (e.g. the git SHA set by CI), or
+    a hash of the project's Python sources and the schema-related packages.
+    """
+    if getattr(settings, 'CODE_VERSION', None):
+        return settings.CODE_VERSION
+
+    digest = hashlib.sha256()
+    for package in ('django', 'djangorestframework', 'drf-spectacular', 'djangorestframework-simplejwt'):
+        digest.update(f'{package}={package_version(package)};'.encode())
+    base_dir = str(settings.BASE_DIR)
+    for app in apps.get_app_configs():
+        if app.path.startswith(base_dir):
+            _hash_sources(digest, app.path, base_dir)
+    _hash_sources(digest, os.path.dirname(os.path.abspath(__file__)), base_dir)
+    return digest.hexdigest()[:16]
+
+
+def _hash_sources(digest, root, base_dir):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in ('__pycache__', 'migrations'))
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                path = os.path.join(dirpath, filename)
+                digest.update(os.path.relpath(path, base_dir).encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+
+
+class RenderedSchema:
+    def __init__(self, version, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, mtime=0)
+        self.etag = f'"{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+class SchemaCache:
+    def __init__(self, cache_dir=SCHEMA_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._version = None
+        self._rendered = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = code_version()
+        return self._version
+
+    def path(self, fmt):
+        return os.path.join(self.cache_dir, f'openapi-{self.version}.{fmt}')
+
+    def get(self, fmt):
+        rendered = self._rendered.get(fmt)
+        if rendered is None:
+            with self._lock:
+                rendered = self._rendered.get(fmt)
+                if rendered is None:
+                    rendered = self._load(fmt) or self.build()[fmt]
+                    self._rendered[fmt] = rendered
+        return rendered
+
+    def _load(self, fmt):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.path(fmt), 'rb') as f:
+                return RenderedSchema(self.version, f.read())
+        except FileNotFoundError:
+            return None
+
+    def build(self):
+        """Generates and renders the schema; also writes it to ``cache_dir``."""
+        schema = SchemaGenerator().get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+        rendered = {fmt: RenderedSchema(self.version, renderer().render(schema, renderer_context={}))
+                    for fmt, renderer in RENDERERS.items()}
+        if self.cache_dir:
+            try:
+                self._write(rendered)
+            except OSError:
+                # Только для чтения (например, контейнер) - живём с кэшем в памяти
+                logger.warning('Cannot write the OpenAPI schema to %s', self.cache_dir, exc_info=True)
+        self._rendered.update(rendered)
+        return rendered
+
+    def _write(self, rendered):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for fmt, schema in rendered.items():
+            path = self.path(fmt)
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(schema.body)
+            os.replace(f'{path}.tmp', path)
+        # Схемы прошлых версий кода
+        for filename in os.listdir(self.cache_dir):
+            if filename.startswith('openapi-') and not filename.startswith(f'openapi-{self.version}.'):
+                os.remove(os.path.join(self.cache_dir, filename))
+
+    def warm(self):
+        """Loads the prebuilt files, if any, without generating the schema."""
+        for fmt in RENDERERS:
+            rendered = self._load(fmt)
+            if rendered is not None:
+                self._rendered[fmt] = rendered
+
+
+schema_cache = SchemaCache()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """SpectacularAPIView answered from :data:`schema_cache`, with ETag and gzip."""
+
+    def _get_schema_response(self, request):
+        # Версии и переводы схемы не кэшируются
+        if self.api_version or request.version or request.GET.get('version') or request.GET.get('lang'):
+            return super()._get_schema_response(request)
+
+        renderer = request.accepted_renderer
+        schema = schema_cache.get(renderer.format)
+        if schema.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(schema.gzipped)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(schema.body)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response['Content-Type'] = content_type
+        response['ETag'] = schema.etag
+        response['Cache-Control'] = 'no-cache'
+        response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
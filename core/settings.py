@@ -26,7 +26,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# В режиме DEBUG Django хранит все SQL-запросы запроса в памяти
+DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
 
 ALLOWED_HOSTS = ['*']
 
@@ -50,24 +51,59 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    # Чтения на реплики, после записи - на primary до конца запроса (core.routers)
+    'core.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # WhiteNoise, совместимый с async-цепочкой (ASGI)
+    'core.middleware.StaticFilesMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Запускает FULL_STACK_MIDDLEWARE для всего, кроме FAST_LANE_PREFIXES
+    'core.middleware.FastLaneMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Middleware, нужные только админке и документации (сессии, CSRF, сообщения).
+# JWT API под FAST_LANE_PREFIXES их пропускает.
+FULL_STACK_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+FAST_LANE_PREFIXES = ['/api/']
+FAST_LANE_EXCLUDED_PREFIXES = ['/api/docs/', '/api/schema/', '/api/redoc/']
+
+# Проверки админки ищут эти middleware в MIDDLEWARE, а они подключены через FastLaneMiddleware
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson, если установлен; без него - стандартные JSONRenderer/JSONParser
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+    # Число своих прокси перед приложением (nginx, балансировщик). IP клиента для
+    # лимитов берётся из X-Forwarded-For только в пределах этих прокси; 0 - REMOTE_ADDR
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
 
+# Готовая схема OpenAPI (core.schema): собирается командой build_schema или на
+# первом запросе и пересобирается при смене версии кода. CODE_VERSION (например,
+# git SHA из CI) заменяет хеш исходников.
+SCHEMA_CACHE_DIR = os.getenv('SCHEMA_CACHE_DIR') or os.path.join(BASE_DIR, '.cache', 'openapi')
+CODE_VERSION = os.getenv('CODE_VERSION') or None
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -92,15 +128,68 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql + замер времени открытия соединения (core.dbstats)
+        'ENGINE': 'core.db.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Постоянные соединения: не платим за connect/TLS/auth на каждый запрос.
+        # Не под ASGI (core.asgi): там соединение привязано к потоку sync_to_async,
+        # и постоянные соединения потоков копились бы без закрытия
+        'CONN_MAX_AGE': 0 if os.getenv('DJANGO_ASGI') == 'true' else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
     }
 }
 
+# Локальная замена Postgres (бенчмарки, разработка без БД): DB_ENGINE=sqlite
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_NAME') or BASE_DIR / 'db.sqlite3',
+    }
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2:5433 (остальные параметры как у
+# default). Роутер core.routers отправляет на них чтения, пока реплика доступна и
+# отстаёт не больше DB_REPLICA_MAX_LAG секунд. В тестах реплики - зеркала default.
+DATABASE_REPLICAS = []
+if DATABASES['default']['ENGINE'] == 'core.db.postgresql':
+    _replica_hosts = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+    for _number, _replica in enumerate(_replica_hosts, start=1):
+        _host, _, _port = _replica.partition(':')
+        DATABASES[f'replica{_number}'] = dict(
+            DATABASES['default'],
+            HOST=_host,
+            PORT=_port or DATABASES['default']['PORT'],
+            # Недоступная реплика не должна держать запрос дольше пары секунд
+            OPTIONS=dict(DATABASES['default'].get('OPTIONS', {}),
+                         connect_timeout=int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))),
+            TEST={'MIRROR': 'default'},
+        )
+        DATABASE_REPLICAS.append(f'replica{_number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5))
+
+# Раз в столько секунд воркер пишет в лог статистику соединений (0 - не писать)
+DB_STATS_LOG_INTERVAL = int(os.getenv('DB_STATS_LOG_INTERVAL', 0))
+
+# Метрики /metrics (core.metrics). С несколькими воркерами gunicorn нужен общий
+# каталог, куда каждый воркер сбрасывает свои счётчики
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+# /metrics не публичный: отвечает адресам из METRICS_ALLOWED_NETWORKS (по REMOTE_ADDR)
+# или запросам с Authorization: Bearer METRICS_TOKEN (bearer_token в Prometheus)
+METRICS_ALLOWED_NETWORKS = [net.strip() for net in os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',')
+                            if net.strip()]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
+# Раз в столько секунд воркер пишет накопленные last_login/last_seen и события
+# входа (accounts.activity); 0 - без фонового потока
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 10))
+ACTIVITY_BUFFER_SIZE = int(os.getenv('ACTIVITY_BUFFER_SIZE', 10000))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -119,6 +208,58 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Алгоритм новых хешей и их стоимость, подбираются под железо командой
+# calibrate_hashers. Старые хеши других алгоритмов продолжают проверяться и
+# пересчитываются после успешного входа (accounts.hashing.Rehasher).
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2_sha256')
+PASSWORD_HASHER_PARAMS = {
+    'pbkdf2_sha256': {'iterations': os.getenv('PBKDF2_ITERATIONS')},
+    'argon2': {
+        'time_cost': os.getenv('ARGON2_TIME_COST'),
+        'memory_cost': os.getenv('ARGON2_MEMORY_COST'),
+        'parallelism': os.getenv('ARGON2_PARALLELISM'),
+    },
+    'scrypt': {
+        'work_factor': os.getenv('SCRYPT_WORK_FACTOR'),
+        'block_size': os.getenv('SCRYPT_BLOCK_SIZE'),
+    },
+}
+_PASSWORD_HASHERS = {
+    'pbkdf2_sha256': 'accounts.hashers.PBKDF2PasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Password hashing process pool (accounts.hashing), 0 workers - hash inline.
+# Пул свой у каждого веб-воркера: по умолчанию ядра делятся между ними
+# (WEB_CONCURRENCY выставляет gunicorn.conf.py), чтобы процессов хеширования
+# всего было не больше, чем ядер
+def _default_hashing_workers():
+    web_workers = int(os.getenv('WEB_CONCURRENCY') or 0)
+    if not web_workers:
+        return 2
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores // web_workers)
+
+
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS') or _default_hashing_workers())
+PASSWORD_HASHING_QUEUE_SIZE = int(os.getenv('PASSWORD_HASHING_QUEUE_SIZE', 32))
+PASSWORD_HASHING_RETRY_AFTER = int(os.getenv('PASSWORD_HASHING_RETRY_AFTER', 1))
+
+# Readiness probe (accounts.health)
+HEALTH_CHECK_CACHE_SECONDS = float(os.getenv('HEALTH_CHECK_CACHE_SECONDS', 5))
+HEALTH_CHECK_SLOW_MS = float(os.getenv('HEALTH_CHECK_SLOW_MS', 200))
+HEALTH_CHECK_MIGRATIONS_CACHE_SECONDS = float(os.getenv('HEALTH_CHECK_MIGRATIONS_CACHE_SECONDS', 60))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -147,14 +288,62 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+]
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=30),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": False,
     "UPDATE_LAST_LOGIN": False,
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.TokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "accounts.serializers.TokenVerifySerializer",
 }
 
+# In-process cache of validated access tokens and users (accounts.authentication)
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 30))
+AUTH_CACHE_MAXSIZE = int(os.getenv('AUTH_CACHE_MAXSIZE', 10000))
+
+# Кэш для данных, общих для всех воркеров. По умолчанию - память процесса,
+# в проде можно указать django.core.cache.backends.redis.RedisCache
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Ограничение попыток входа по IP и email (accounts.throttling), до хеширования пароля.
+# Счётчики в памяти воркера; accounts.throttling.CacheStore хранит их в
+# LOGIN_THROTTLE_CACHE (например, Redis), и лимиты становятся общими для воркеров
+LOGIN_THROTTLE_STORE = os.getenv('LOGIN_THROTTLE_STORE', 'accounts.throttling.LocalStore')
+LOGIN_THROTTLE_CACHE = 'default'
+LOGIN_THROTTLE_MAXSIZE = int(os.getenv('LOGIN_THROTTLE_MAXSIZE', 100000))
+LOGIN_THROTTLE_WINDOW = int(os.getenv('LOGIN_THROTTLE_WINDOW', 60))
+LOGIN_THROTTLE_IP_LIMIT = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', 60))
+LOGIN_THROTTLE_EMAIL_LIMIT = int(os.getenv('LOGIN_THROTTLE_EMAIL_LIMIT', 10))
+LOGIN_THROTTLE_BACKOFF = int(os.getenv('LOGIN_THROTTLE_BACKOFF', 5))
+LOGIN_THROTTLE_MAX_BACKOFF = int(os.getenv('LOGIN_THROTTLE_MAX_BACKOFF', 900))
+# Адреса без лимита по IP (нагрузочные тесты, внутренние сервисы); сравниваются
+# с REMOTE_ADDR, а не с X-Forwarded-For
+LOGIN_THROTTLE_TRUSTED_IPS = [ip.strip() for ip in os.getenv('LOGIN_THROTTLE_TRUSTED_IPS', '').split(',') if ip.strip()]
+
+# Наборы прав пользователей и групп в памяти воркера (accounts.permission_cache).
+# Изменения прав сбрасывают кэш через счётчик версии в этом алиасе CACHES
+PERMISSION_CACHE = 'default'
+PERMISSION_CACHE_TTL = int(os.getenv('PERMISSION_CACHE_TTL', 300))
+PERMISSION_CACHE_MAXSIZE = int(os.getenv('PERMISSION_CACHE_MAXSIZE', 10000))
+# Срок записей, пока PERMISSION_CACHE - память процесса и версия до других воркеров не доходит
+PERMISSION_CACHE_LOCAL_TTL = int(os.getenv('PERMISSION_CACHE_LOCAL_TTL', 5))
+
+# In-memory blacklist JTI index (accounts.blacklist)
+BLACKLIST_INDEX_CACHE = 'default'
+BLACKLIST_INDEX_SYNC_INTERVAL = int(os.getenv('BLACKLIST_INDEX_SYNC_INTERVAL', 30))
+BLACKLIST_INDEX_REBUILD_INTERVAL = int(os.getenv('BLACKLIST_INDEX_REBUILD_INTERVAL', 600))
+
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Фоновая запись last_login/last_seen и событий входа (accounts.activity)
+from accounts.activity import tracker as activity_tracker  # noqa: E402
+
+activity_tracker.start()
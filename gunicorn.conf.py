@@ -0,0 +1,144 @@
+"""
+Production gunicorn settings (picked up automatically from the working directory).
+
+GUNICORN_WORKER_CLASS=gthread (default) serves core.wsgi with threaded
+workers, GUNICORN_WORKER_CLASS=uvicorn serves core.asgi (async views) with
+uvicorn workers. Worker counts follow the CPUs available to the container
+and can be overridden with WEB_CONCURRENCY / GUNICORN_THREADS; the per-worker
+password hashing pools split the CPUs between the workers.
+"""
+import glob
+import os
+import time
+
+_loaded_at = time.perf_counter()
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Общий каталог метрик, чтобы /metrics любого воркера отдавал сумму по всем (core.metrics)
+os.environ.setdefault('METRICS_DIR', '/tmp/mamacare-metrics')
+
+
+def _env_int(name, default):
+    return int(os.getenv(name) or default)
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_cores = _cpus()
+_asgi = os.getenv('GUNICORN_WORKER_CLASS', 'gthread') == 'uvicorn'
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+if _asgi:
+    wsgi_app = 'core.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    # Один event loop на ядро, ожидание БД и хеширования не держит поток
+    workers = _env_int('WEB_CONCURRENCY', _cores)
+else:
+    wsgi_app = 'core.wsgi:application'
+    worker_class = 'gthread'
+    workers = _env_int('WEB_CONCURRENCY', 2 * _cores + 1)
+    threads = _env_int('GUNICORN_THREADS', 4)
+
+# Для настроек: по числу воркеров делятся ядра между их пулами хеширования
+# (PASSWORD_HASHING_WORKERS), иначе 2 * ядра + 1 воркеров запускали бы по 2 процесса
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+# Код и данные приложения загружаются в мастере один раз и делятся с воркерами
+# через copy-on-write. С автоперезагрузкой (разработка) preload не работает.
+reload = os.getenv('GUNICORN_RELOAD', 'false').lower() == 'true'
+preload_app = not reload
+
+# Перезапуск воркеров против утечек памяти; jitter, чтобы не все сразу
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Heartbeat-файлы воркеров в памяти: на overlayfs Docker fsync может зависать
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def on_starting(server):
+    metrics_dir = os.environ['METRICS_DIR']
+    # Файлы воркеров прошлого запуска
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.remove(path)
+
+    if not server.cfg.preload_app:
+        return
+    app_seconds = time.perf_counter() - _loaded_at
+
+    # URLconf (а с ним DRF, views, сериализаторы) Django грузит на первом запросе;
+    # загружаем в мастере, чтобы воркеры получили его готовым
+    started = time.perf_counter()
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    urls_seconds = time.perf_counter() - started
+
+    # Готовая схема OpenAPI (build_schema) тоже достаётся воркерам из мастера
+    from core.schema import schema_cache
+
+    schema_cache.warm()
+
+    # core.asgi запускает пул хеширования при импорте; в мастере он не нужен,
+    # воркеры создают свой (post_worker_init)
+    from accounts.hashing import pool
+
+    pool.shutdown()
+    # Поток записи активности тоже: в мастере запросов нет
+    from accounts.activity import tracker
+
+    tracker.stop()
+
+    server.log.info('Startup: application loaded in %.3fs, URLconf in %.3fs (%d workers, %s)',
+                    app_seconds, urls_seconds, server.cfg.workers, server.cfg.worker_class_str)
+
+
+def when_ready(server):
+    server.log.info('Startup: ready to serve in %.3fs', time.perf_counter() - _loaded_at)
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    # Процессы пула хеширования создаются в каждом воркере сразу, а не на первом логине
+    from accounts.activity import tracker
+    from accounts.hashing import pool
+
+    pool.start()
+    tracker.start()
+    worker.log.info('Startup: worker %s booted in %.3fs', worker.pid, time.perf_counter() - worker.forked_at)
+
+
+def worker_exit(server, worker):
+    from accounts.activity import tracker
+    from accounts.hashing import rehasher
+    from core import metrics
+
+    # Буфер входов и активности не должен пропасть при перезапуске воркера
+    tracker.stop()
+    rehasher.wait()
+    metrics.flusher.flush()
+
+
+def child_exit(server, worker):
+    from core import metrics
+
+    metrics.archive_worker(worker.pid)